@@ -53,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'base.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,6 +98,59 @@ DATABASES = {
     }
 }
 
+# Number of profile operations shown per page of the runtests index
+OPERATIONS_PAGE_SIZE = 100
+# Upper bound for the page size a client may request
+OPERATIONS_MAX_PAGE_SIZE = 1000
+
+# Number of rows written per query by bulk inserts and updates
+DB_BATCH_SIZE = 500
+
+# Upper bounds of a load test. Tests run within the request, so the
+# duration in seconds must stay below the timeouts of gunicorn (timeout in
+# gunicorn.conf.py) and nginx (proxy_read_timeout, 60 by default).
+LOAD_MAX_REQUESTS = 10000
+LOAD_MAX_DURATION = 50
+
+# Seconds an open-loop load test at a constant rate runs if no duration
+# is given
+OPEN_LOOP_DEFAULT_DURATION = 10
+
+# Number of requests an open-loop load test can have in flight. Requests
+# beyond that start late, which is reported as schedule lag. Raise
+# API_POOL_SIZE as well to keep their connections alive.
+OPEN_LOOP_MAX_WORKERS = 64
+
+# Serve Prometheus metrics of the calls to the API at /metrics
+METRICS_ENABLED = True
+
+# Share of call payloads written to the call log, from 0 (none) to 1 (all)
+API_LOG_PAYLOAD_SAMPLE_RATE = 0.01
+
+# Logged payloads are cut to this many characters
+API_LOG_PAYLOAD_MAX_LENGTH = 1024
+
+# Records of the call log waiting to be written, more are dropped
+API_LOG_QUEUE_SIZE = 10000
+
+# Let staff users profile requests with the header X-Profile or the query
+# parameter _profile, see base/profiling.py
+PROFILING_ENABLED = True
+
+# Directory the profiles are stored in
+PROFILING_DIR = os.path.join(BASE_DIR, '..', '..', 'profiles')
+
+# Number of profiles kept, older ones are removed
+PROFILING_KEEP = 50
+
+# Seconds between the stack samples of speedscope profiles
+PROFILING_SAMPLE_INTERVAL = 0.005
+
+# Number of test results buffered before they are written to the run history
+RUN_HISTORY_BUFFER = 100
+# Days the run history is kept, None keeps it forever
+RUN_HISTORY_DAYS = 90
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 
@@ -142,9 +196,27 @@ STATIC_ROOT = os.path.join(BASE_DIR, '..', '..', 'static-collected')
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '[{asctime}] {message}',
+            'datefmt': '%d/%b/%Y %H:%M:%S',
+            'style': '{',
+        },
+        'json': {
+            '()': 'obp.calllog.JSONFormatter',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+        # Writes the call log from a separate thread, set filename to keep
+        # it out of the gunicorn error log
+        'calls': {
+            'class': 'obp.calllog.QueuedHandler',
+            'formatter': 'json',
+            'filename': None,
         },
         'mail_admins': {
             'level': 'ERROR',
@@ -159,18 +231,61 @@ LOGGING = {
         'obp': {
             'handlers': ['console'],
             'level': 'INFO',
-        }
+        },
+        'obp.calls': {
+            'handlers': ['calls'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
 # Setup a simple cache to avoid hitting the API too often
+# Swagger documents are shared by all worker processes in the `swagger` cache
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'swagger': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, '..', '..', 'swagger-cache'),
+        'TIMEOUT': 60 * 60 * 24,
+    },
 }
+SWAGGER_CACHE = 'swagger'
+# Directory of the lock files which let only one process at a time
+# refresh a swagger document
+SWAGGER_LOCK_DIR = os.path.join(BASE_DIR, '..', '..', 'swagger-locks')
+# Seconds to wait for a refresh by somebody else before refreshing anyway
+SWAGGER_LOCK_TIMEOUT = 60
+# Seconds after which cached API data is revalidated
 CACHE_TIMEOUT = 10
 
+# Pooled sessions to the API, shared by all requests of a worker process
+# Number of hosts to keep connection pools for per session
+API_POOL_CONNECTIONS = 10
+# Number of keep-alive connections per host
+API_POOL_SIZE = 10
+# Seconds after which an unused session is closed
+API_SESSION_IDLE_TIMEOUT = 300
+
+# Seconds after which the list of API versions is refreshed in the background
+VERSIONS_TIMEOUT = 60 * 10
+
+# API versions offered while /api/versions cannot be fetched
+API_VERSIONS_FALLBACK = [
+    'OBPv5.1.0', 'OBPv5.0.0', 'OBPv4.0.0', 'OBPv3.1.0', 'OBPv3.0.0', 'MXOFv0.0.1',
+    'BGv1.3',
+]
+
+# Seconds the API user fetched at login is cached in the session
+API_USER_TTL = 60 * 60
+
+# Number of operations executed at once when running a profile server-side
+RUN_CONCURRENCY = 8
+# Upper bound for the concurrency a client may request
+RUN_MAX_CONCURRENCY = 32
+
 
 LOGIN_URL = reverse_lazy('home')
 
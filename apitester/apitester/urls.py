@@ -5,8 +5,9 @@ URLs for apitester
 
 from django.conf.urls import url, include
 
-from base.views import HomeView
+from base.views import HomeView, download_profile
 
+from obp.metrics import metrics_view
 from obp.views import OAuthInitiateView, OAuthAuthorizeView, DirectLoginView, GatewayLoginView, LogoutView
 
 from django.conf import settings
@@ -38,6 +39,9 @@ urlpatterns = [
         GatewayLoginView.as_view(), name='gatewaylogin'),
     url(r'^logout$',
         LogoutView.as_view(), name='oauth-logout'),
+    url(r'^metrics$', metrics_view, name='metrics'),
+    url(r'^profiles/(?P<profile_id>[0-9a-f]{32})$',
+        download_profile, name='profile-download'),
     url(r'^obp/', include('obp.urls')),
     url(r'^runtests/', include('runtests.urls')),
 ]
@@ -6,7 +6,8 @@ Context processors for base app
 from django.conf import settings
 from django.contrib import messages
 
-from obp.api import API, APIError
+from obp.api import APIError
+from obp.identity import get_api_user
 
 
 def api_root(request):
@@ -25,9 +26,8 @@ def api_username(request):
     username = 'not authenticated'
     if request.user.is_authenticated:
         try:
-            api = API(request.session.get('obp'))
-            data = api.get('/users/current')
-            if 'username' in data:
+            data = get_api_user(request)
+            if data['username']:
                 username = data['username']
         except APIError as err:
             messages.error(request, err)
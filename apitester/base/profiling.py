@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling of requests to the tester itself
+
+Staff users profile a request by sending the header X-Profile or the query
+parameter _profile with the format of the profile:
+
+- pstats: cProfile of the thread serving the request, for pstats or
+  snakeviz
+- speedscope: stack samples of all threads, which includes the workers of
+  a test run, for https://www.speedscope.app
+
+The response carries a Server-Timing header with the time spent in the
+whole request, in SQL queries and in calls to the OBP API, and X-Profile-Url
+to download the profile from. Calls to the API are counted in the whole
+process while the request runs, so with a threaded server they may include
+calls of concurrent requests. Streamed responses are only profiled until
+their body starts.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+from obp.api import call_finished
+
+
+# Supported profile formats and the extension of their files
+FORMATS = {
+    'pstats': 'prof',
+    'speedscope': 'speedscope.json',
+}
+
+
+def get_format(request):
+    """Returns the requested profile format, None if none is requested"""
+    requested = request.META.get('HTTP_X_PROFILE') or request.GET.get('_profile')
+    if requested is None:
+        return None
+    if requested not in FORMATS:
+        requested = 'pstats'
+    return requested
+
+
+def get_profile_path(profile_id, profile_format):
+    return os.path.join(
+        settings.PROFILING_DIR,
+        '{}.{}'.format(profile_id, FORMATS[profile_format]))
+
+
+def find_profile(profile_id):
+    """Returns path and format of a stored profile, None if there is none"""
+    for profile_format in FORMATS:
+        path = get_profile_path(profile_id, profile_format)
+        if os.path.exists(path):
+            return path, profile_format
+    return None
+
+
+def purge_profiles():
+    """Removes all but the newest PROFILING_KEEP profiles"""
+    directory = settings.PROFILING_DIR
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    paths.sort(key=os.path.getmtime, reverse=True)
+    for path in paths[settings.PROFILING_KEEP:]:
+        try:
+            os.remove(path)
+        except OSError:
+            # Already removed by another worker
+            pass
+
+
+class StackSampler(threading.Thread):
+    """Samples the stacks of all other threads at a fixed interval"""
+
+    def __init__(self, interval):
+        super(StackSampler, self).__init__(name='stack-sampler')
+        self.daemon = True
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.frames = {}
+        self.samples = {}
+        self.names = {}
+
+    def get_frame(self, frame):
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frames:
+            self.frames[key] = len(self.frames)
+        return self.frames[key]
+
+    def sample(self, weight):
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self.get_frame(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.setdefault(ident, []).append((stack, weight))
+        for thread in threading.enumerate():
+            self.names.setdefault(thread.ident, thread.name)
+
+    def run(self):
+        last = time.perf_counter()
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            self.sample((now - last) * 1000)
+            last = now
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def speedscope(self, name):
+        """Returns the samples in the speedscope file format"""
+        frames = sorted(self.frames, key=self.frames.get)
+        profiles = []
+        for ident, samples in self.samples.items():
+            weights = [round(weight, 3) for _, weight in samples]
+            profiles.append({
+                'type': 'sampled',
+                'name': self.names.get(ident, str(ident)),
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(weights), 3),
+                'samples': [stack for stack, _ in samples],
+                'weights': weights,
+            })
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'apitester',
+            'shared': {'frames': [
+                {'name': frame_name, 'file': filename, 'line': line}
+                for frame_name, filename, line in frames
+            ]},
+            'profiles': profiles,
+        }
+
+
+class RequestProfile(object):
+    """Profiles a request and counts its SQL queries and API calls"""
+
+    def __init__(self, request, profile_format):
+        self.request = request
+        self.format = profile_format
+        self.id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.query_time = 0.0
+        self.calls = 0
+        self.call_time = 0.0
+        self.duration = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        time_start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - time_start
+
+    def record_call(self, sender, seconds, **kwargs):
+        with self.lock:
+            self.calls += 1
+            self.call_time += seconds
+
+    def run(self, get_response):
+        """Returns the response of the profiled request"""
+        if self.format == 'pstats':
+            profiler = cProfile.Profile()
+        else:
+            profiler = StackSampler(settings.PROFILING_SAMPLE_INTERVAL)
+        call_finished.connect(self.record_call, weak=False, dispatch_uid=self.id)
+        time_start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(self.record_query):
+                if self.format == 'pstats':
+                    response = profiler.runcall(get_response, self.request)
+                else:
+                    profiler.start()
+                    try:
+                        response = get_response(self.request)
+                    finally:
+                        profiler.stop()
+        finally:
+            self.duration = time.perf_counter() - time_start
+            call_finished.disconnect(dispatch_uid=self.id)
+        self.save(profiler)
+        return response
+
+    def save(self, profiler):
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        path = get_profile_path(self.id, self.format)
+        if self.format == 'pstats':
+            profiler.dump_stats(path)
+        else:
+            name = '{} {}'.format(self.request.method, self.request.path)
+            with open(path, 'w') as handle:
+                json.dump(profiler.speedscope(name), handle)
+        purge_profiles()
+
+    def get_server_timing(self):
+        return ', '.join([
+            'app;dur={:.1f}'.format(self.duration * 1000),
+            'db;dur={:.1f};desc="{} queries"'.format(
+                self.query_time * 1000, self.queries),
+            'api;dur={:.1f};desc="{} calls"'.format(
+                self.call_time * 1000, self.calls),
+        ])
+
+
+class ProfilingMiddleware(object):
+    """Profiles requests of staff users which ask for it"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile_format = None
+        if settings.PROFILING_ENABLED and request.user.is_staff:
+            profile_format = get_format(request)
+        if profile_format is None:
+            return self.get_response(request)
+
+        profile = RequestProfile(request, profile_format)
+        response = profile.run(self.get_response)
+        url = reverse('profile-download', args=[profile.id])
+        response['Server-Timing'] = profile.get_server_timing()
+        response['X-Profile-Url'] = url
+        return response
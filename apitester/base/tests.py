@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for base app
+"""
+
+import json
+import pstats
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from obp.api import API, call_finished
+
+from .profiling import ProfilingMiddleware, find_profile
+
+
+def get_response(request):
+    User.objects.count()
+    call_finished.send(
+        sender=API, method='GET', url='/banks', status_code=200, seconds=0.25)
+    time.sleep(0.02)
+    return HttpResponse('ok')
+
+
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.staff = User.objects.create(username='staff', is_staff=True)
+        self.middleware = ProfilingMiddleware(get_response)
+
+    def get(self, user, **kwargs):
+        request = RequestFactory().get('/runtests/', **kwargs)
+        request.user = user
+        with self.settings(PROFILING_DIR=self.directory):
+            return self.middleware(request)
+
+    def get_profile_id(self, response):
+        return response['X-Profile-Url'].rsplit('/', 1)[1]
+
+    def test_ignores_requests_without_flag_or_staff(self):
+        self.assertNotIn('X-Profile-Url', self.get(self.staff))
+        response = self.get(AnonymousUser(), HTTP_X_PROFILE='pstats')
+        self.assertNotIn('X-Profile-Url', response)
+
+    def test_stores_pstats_with_server_timing(self):
+        response = self.get(self.staff, HTTP_X_PROFILE='pstats')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIn('api;dur=250.0;desc="1 calls"', response['Server-Timing'])
+        with self.settings(PROFILING_DIR=self.directory):
+            path, _ = find_profile(self.get_profile_id(response))
+        functions = [name for _, _, name in pstats.Stats(path).stats]
+        self.assertIn('get_response', functions)
+
+    @override_settings(PROFILING_SAMPLE_INTERVAL=0.001)
+    def test_stores_speedscope_samples(self):
+        response = self.get(self.staff, data={'_profile': 'speedscope'})
+        with self.settings(PROFILING_DIR=self.directory):
+            path, profile_format = find_profile(self.get_profile_id(response))
+        self.assertEqual(profile_format, 'speedscope')
+        with open(path) as handle:
+            data = json.load(handle)
+        names = [frame['name'] for frame in data['shared']['frames']]
+        self.assertIn('get_response', names)
+        self.assertEqual(data['profiles'][0]['type'], 'sampled')
+
+    def test_download_is_staff_only(self):
+        response = self.get(self.staff, HTTP_X_PROFILE='pstats')
+        url = response['X-Profile-Url']
+        with self.settings(PROFILING_DIR=self.directory):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.client.force_login(self.staff)
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            response.close()
+            self.assertEqual(
+                self.client.get(reverse('profile-download', args=['0' * 32])).status_code,
+                404)
@@ -3,24 +3,27 @@
 Views for base app
 """
 
+import os
+
 from django.conf import settings
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404
 from django.views.generic import TemplateView
 
 from obp.forms import DirectLoginForm, GatewayLoginForm
 from obp.api import API, APIError
+from obp.versions import catalogue
+
+from .profiling import find_profile
 
 def get_api_versions(request):
     api = API(request.session.get('obp'))
     try:
-        urlpath = '/api/versions'
-        result = api.get(urlpath)
-        if 'scanned_api_versions' in result:
-            return [apiversion['API_VERSION'] for apiversion in sorted(result['scanned_api_versions'], key=lambda d: d['API_VERSION'])]
-        else:
-            return []
+        return catalogue.get_versions(api)
     except APIError as err:
-        messages.error(self.request, err)
-        return []
+        messages.error(request, err)
+        return catalogue.get_fallback_versions()
 
 class HomeView(TemplateView):
     """View for home page"""
@@ -38,3 +41,16 @@ class HomeView(TemplateView):
             'logo_url': settings.LOGO_URL,
         })
         return context
+
+
+def download_profile(request, profile_id):
+    """Downloads a profile stored by the ProfilingMiddleware"""
+    if not request.user.is_staff:
+        raise PermissionDenied
+    found = find_profile(profile_id)
+    if found is None:
+        raise Http404
+    path, _ = found
+    return FileResponse(
+        open(path, 'rb'), as_attachment=True,
+        filename=os.path.basename(path))
@@ -6,27 +6,30 @@ It instantiates a convenience api object for imports, e.g.:
 from obp.api import api
 """
 
-from datetime import datetime
-import importlib
 import logging
 import time
 
-import requests
-from requests.exceptions import ConnectionError
+from requests.exceptions import RequestException
 
 from django.conf import settings
-from django.core.cache import cache
+from django.dispatch import Signal
+
+from . import calllog, metrics, timings
+from .sessionpool import pool
+from .swagger import swagger_store
+from .versions import catalogue
 
 
-DATE_FORMAT = '%d/%b/%Y %H:%M:%S'
 LOGGER = logging.getLogger(__name__)
 
+# Sent after every call with method, url, status_code (None if there was no
+# response) and seconds
+call_finished = Signal()
+
 
 def log(level, message):
     """Logs a given message on a given level to log facility"""
-    now = datetime.now().strftime(DATE_FORMAT)
-    msg = '[{}] API: {}'.format(now, message)
-    LOGGER.log(level, msg)
+    LOGGER.log(level, 'API: %s', message)
 
 
 class APIError(Exception):
@@ -44,25 +47,58 @@ class API(object):
             self.start_session(session_data)
         self.session_data = session_data
 
-    def call(self, method='GET', url='', payload=None):
-        """Workhorse which actually calls the API"""
-        log(logging.INFO, '{} {}'.format(method, url))
-        if payload:
-            log(logging.INFO, 'Payload: {}'.format(payload))
-        # use `requests` if no session has been started
-        session = self.session or requests
-        time_start = time.time()
+    def call(self, method='GET', url='', payload=None, headers=None,
+             operation_id=None, api_version=None):
+        """
+        Workhorse which actually calls the API
+        operation_id and api_version only label the call in the metrics
+        The call is logged to the call log, see obp.calllog
+        """
+        correlation_id = calllog.new_correlation_id()
+        # use the shared anonymous session if no session has been started
+        session = self.session or pool.get()
+        pool.touch(session)
+        timer = timings.start()
+        metrics.IN_FLIGHT.inc()
+        time_start = time.perf_counter()
         try:
+            # Stream to tell the time to the first byte from the transfer
             if payload:
-                response = session.request(method, url, json=payload, verify=False)
+                response = session.request(
+                    method, url, json=payload, headers=headers, verify=False,
+                    stream=True)
             else:
-                response = session.request(method, url, verify=False)
-        except ConnectionError as err:
+                response = session.request(
+                    method, url, headers=headers, verify=False, stream=True)
+            time_headers = time.perf_counter()
+            response.content
+        except RequestException as err:
+            elapsed = time.perf_counter() - time_start
+            metrics.observe(method, url, None, elapsed, operation_id, api_version)
+            calllog.log_call(
+                correlation_id, method, url, execution_time=int(elapsed * 1000),
+                payload=payload, error=err)
+            call_finished.send(
+                sender=API, method=method, url=url, status_code=None,
+                seconds=elapsed)
             raise APIError(err)
-        time_end = time.time()
+        finally:
+            timings.stop()
+            metrics.IN_FLIGHT.dec()
+        time_end = time.perf_counter()
+        metrics.observe(
+            method, url, response.status_code, time_end - time_start,
+            operation_id, api_version)
+        call_finished.send(
+            sender=API, method=method, url=url,
+            status_code=response.status_code, seconds=time_end - time_start)
+        response.timings = timer.finish(time_start, time_headers, time_end)
         elapsed = int((time_end - time_start) * 1000)
-        log(logging.INFO, 'Took {} ms'.format(elapsed))
+        calllog.log_call(
+            correlation_id, method, url, response.status_code, elapsed,
+            response.timings, payload)
         response.execution_time = elapsed
+        response.correlation_id = correlation_id
         return response
 
     def get(self, urlpath=''):
@@ -150,14 +186,13 @@ class API(object):
         - Authenticator class name (e.g. obp.oauth.OAuthAuthenticator)
         - Token data
         for subsequent requests to the API
+
+        Sessions are taken from the process-wide pool, so connections are
+        reused across Django requests with the same credentials.
         """
         if 'authenticator' in session_data and\
                 'authenticator_kwargs' in session_data:
-            mod_name, cls_name = session_data['authenticator'].rsplit('.', 1)
-            log(logging.INFO, 'Authenticator {}'.format(cls_name))
-            cls = getattr(importlib.import_module(mod_name), cls_name)
-            authenticator = cls(**session_data['authenticator_kwargs'])
-            self.session = authenticator.get_session()
+            self.session = pool.get(session_data)
             return self.session
         else:
             return None
@@ -188,19 +223,21 @@ class API(object):
         # OBPv4.0.0  /obp/v4.0.0/resource-docs/OBPv4.0.0/obp (previously /obp/v4.0.0/resource-docs/v4.0.0/obp)
         # etc.
 
-        urlpath = '/resource-docs/{}/swagger?{}'.format(api_version, resource_doc_params)
+        urlpath = self.get_swagger_urlpath(api_version, resource_doc_params)
+        return swagger_store.get(self, urlpath)
 
-        print ("urlpath is {}".format(urlpath))
+    def get_swagger_urlpath(self, api_version, resource_doc_params=''):
+        """Gets the urlpath of the swagger definition of given API version"""
+        return '/resource-docs/{}/swagger?{}'.format(api_version, resource_doc_params)
 
-        if not cache.get(urlpath):
-            swagger = self.get(urlpath)
-            cache.set(urlpath, swagger, settings.CACHE_TIMEOUT)
-        return cache.get(urlpath)
+    def get_swagger_index(self, api_version='OBPv3.1.0', resource_doc_params=''):
+        """
+        Gets a lookup of operationId to path, method, summary, request body
+        definition and success status codes of the swagger definition
+        """
+        urlpath = self.get_swagger_urlpath(api_version, resource_doc_params)
+        return swagger_store.get_index(self, urlpath)
 
     def get_api_version_choices(self):
         """Gets a list of APIs Version and APIs Version as used by form choices"""
-        choices = [('', ('Choose ...'))]
-        result = self.get('/api/versions')
-        for version in sorted(result['scanned_api_versions'], key=lambda d: d['API_VERSION']) :
-            choices.append((version['API_VERSION'], version['API_VERSION']))
-        return choices
+        return catalogue.get_choices(self)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Structured log of the calls made to the OBP API
+
+Every call is logged as one JSON line to the obp.calls logger, tagged with
+a correlation id which is also set on the response. Callers only put the
+record on a bounded queue, a listener thread formats and writes it, so
+slow log output does not slow down load tests. If the queue is full,
+records are dropped and counted in the metrics instead of blocking.
+
+Only a sample of payloads is logged, see API_LOG_PAYLOAD_SAMPLE_RATE, and
+logged payloads are cut to API_LOG_PAYLOAD_MAX_LENGTH characters. Payloads
+are serialized by the listener, so the cost for the caller does not depend
+on their size.
+"""
+
+import atexit
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+import os
+from queue import Full, Queue
+import random
+import sys
+import time
+import uuid
+
+from django.conf import settings
+
+from . import metrics
+
+
+LOGGER = logging.getLogger('obp.calls')
+
+
+def new_correlation_id():
+    """Returns a new id to correlate the log record of a call with"""
+    return uuid.uuid4().hex
+
+
+def sample_payload(payload):
+    """Returns given payload if it is sampled for the log, None otherwise"""
+    if not payload:
+        return None
+    rate = settings.API_LOG_PAYLOAD_SAMPLE_RATE
+    if rate <= 0 or random.random() >= rate:
+        return None
+    return payload
+
+
+def log_call(correlation_id, method, url, status_code=None,
+             execution_time=None, timings=None, payload=None, error=None):
+    """Logs a finished call, payload is logged if it is sampled"""
+    if not LOGGER.isEnabledFor(logging.INFO):
+        return
+    call = {
+        'correlation_id': correlation_id,
+        'method': method.upper(),
+        'url': url,
+        'status_code': status_code,
+        'execution_time': execution_time,
+        'timings': timings,
+        'payload': sample_payload(payload),
+    }
+    if error is not None:
+        call['error'] = str(error)
+    level = logging.INFO if error is None else logging.WARNING
+    LOGGER.log(level, 'API call', extra={'call': call})
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats call records as one JSON object per line"""
+
+    def format(self, record):
+        data = {
+            'time': time.strftime(
+                '%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) +
+                '.{:03d}Z'.format(int(record.msecs)),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        call = getattr(record, 'call', None)
+        if call is not None:
+            data.update(call)
+            payload = call.get('payload')
+            if payload is not None:
+                data['payload'] = self.truncate(json.dumps(payload))
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+    def truncate(self, text):
+        max_length = settings.API_LOG_PAYLOAD_MAX_LENGTH
+        if len(text) <= max_length:
+            return text
+        return '{}... ({} characters)'.format(text[:max_length], len(text))
+
+
+class Listener(QueueListener):
+    """Writes queued records from a thread of its own"""
+
+    def enqueue_sentinel(self):
+        # Wait for room instead of failing to stop when the queue is full
+        self.queue.put(self._sentinel)
+
+
+class QueuedHandler(QueueHandler):
+    """
+    Hands records to a listener thread which writes them to given file, or
+    stream if there is none
+
+    The listener is started on the first record of every process, as
+    gunicorn forks its workers after the logging has been configured.
+    """
+
+    def __init__(self, filename=None, stream=None, queue_size=None):
+        if queue_size is None:
+            queue_size = settings.API_LOG_QUEUE_SIZE
+        super(QueuedHandler, self).__init__(Queue(queue_size))
+        self.filename = filename
+        self.stream = stream or sys.stderr
+        self.listener = None
+        self.pid = None
+
+    def start(self):
+        if self.filename:
+            target = WatchedFileHandler(self.filename)
+        else:
+            target = logging.StreamHandler(self.stream)
+        target.setFormatter(self.formatter or JSONFormatter())
+        self.listener = Listener(self.queue, target)
+        self.listener.start()
+        self.pid = os.getpid()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+        self.listener = None
+
+    def prepare(self, record):
+        # Formatting is left to the listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            metrics.CALL_LOG_DROPPED.inc()
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.start()
+        super(QueuedHandler, self).emit(record)
+
+    def close(self):
+        self.stop()
+        super(QueuedHandler, self).close()
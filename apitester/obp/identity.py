@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+API identity of the logged-in user, cached in the Django session
+
+Fetched once at login and refreshed after API_USER_TTL seconds, so page
+renders do not need to call /users/current.
+"""
+
+import time
+
+from django.conf import settings
+
+from .api import API
+
+
+SESSION_KEY = 'obp_user'
+
+
+def store_api_user(request, data):
+    """Stores given /users/current data in the session"""
+    if not isinstance(data, dict):
+        data = {}
+    request.session[SESSION_KEY] = {
+        'user_id': data.get('user_id'),
+        'username': data.get('username'),
+        'email': data.get('email'),
+        'fetched': time.time(),
+    }
+    return request.session[SESSION_KEY]
+
+
+def refresh_api_user(request):
+    """Fetches the current user from the API and stores it in the session"""
+    api = API(request.session.get('obp'))
+    data = api.get('/users/current')
+    return store_api_user(request, data)
+
+
+def get_api_user(request, refresh=False):
+    """
+    Returns the cached API user of given request, fetching it if it is
+    missing, expired or a refresh is requested
+    Lets APIError bubble up
+    """
+    user = request.session.get(SESSION_KEY)
+    if refresh or not user or\
+            time.time() - user['fetched'] > settings.API_USER_TTL:
+        user = refresh_api_user(request)
+    return user
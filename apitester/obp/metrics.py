@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus metrics of the calls made to the OBP API
+
+Served at /metrics in the text exposition format. With several gunicorn
+workers, set the environment variable prometheus_multiproc_dir to a
+directory shared by them before they start (gunicorn.conf.py does so):
+every worker then writes its values to memory-mapped files there and
+/metrics aggregates all of them.
+"""
+
+import os
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+    CONTENT_TYPE_LATEST)
+from prometheus_client import multiprocess
+
+
+API_VERSION_PATTERN = re.compile(r'/obp/(v\d+\.\d+\.\d+)/')
+LABELS = ['operation_id', 'method', 'status_class', 'api_version']
+
+CALLS = Counter(
+    'apitester_api_calls_total',
+    'Calls made to the OBP API',
+    LABELS,
+)
+LATENCY = Histogram(
+    'apitester_api_call_duration_seconds',
+    'Duration of calls made to the OBP API',
+    LABELS,
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30),
+)
+IN_FLIGHT = Gauge(
+    'apitester_api_calls_in_flight',
+    'Calls to the OBP API waiting for their response',
+    multiprocess_mode='livesum',
+)
+POOLED_SESSIONS = Gauge(
+    'apitester_pooled_sessions',
+    'Sessions with keep-alive connections to the OBP API',
+    multiprocess_mode='livesum',
+)
+ACTIVE_RUNS = Gauge(
+    'apitester_active_runs',
+    'Test runs in progress',
+    multiprocess_mode='livesum',
+)
+CALL_LOG_DROPPED = Counter(
+    'apitester_call_log_dropped_total',
+    'Records of the call log dropped because its queue was full',
+)
+
+
+def get_api_version(url):
+    """Returns the API version in given url, e.g. v4.0.0, or unknown"""
+    match = API_VERSION_PATTERN.search(url)
+    return match.group(1) if match else 'unknown'
+
+
+def get_status_class(status_code):
+    """Returns e.g. 2xx for 201, error if there was no response"""
+    if status_code is None:
+        return 'error'
+    return '{}xx'.format(status_code // 100)
+
+
+def observe(method, url, status_code, seconds, operation_id=None,
+            api_version=None):
+    """
+    Counts a finished call
+    api_version is the one of the test profile, if not given it is taken
+    from the url
+    """
+    labels = {
+        'operation_id': operation_id or '',
+        'method': method.upper(),
+        'status_class': get_status_class(status_code),
+        'api_version': api_version or get_api_version(url),
+    }
+    CALLS.labels(**labels).inc()
+    LATENCY.labels(**labels).observe(seconds)
+
+
+def get_registry():
+    """Returns the registry to expose, aggregating all workers if needed"""
+    if 'prometheus_multiproc_dir' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    """Exposes the metrics in the Prometheus text format"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
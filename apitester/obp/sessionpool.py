@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide registry of pooled sessions to the OBP API
+
+Sessions are keyed by authenticator class and its credentials, so every
+Django request made with the same login reuses the same keep-alive
+connections instead of paying TCP and TLS setup again.
+"""
+
+import importlib
+import logging
+import threading
+import time
+
+import requests
+
+from django.conf import settings
+
+from . import metrics
+from .timings import TimedHTTPAdapter
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def get_authenticator_class(path):
+    """Resolves a dotted authenticator path, e.g. obp.oauth.OAuthAuthenticator"""
+    mod_name, cls_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(mod_name), cls_name)
+
+
+def mount_adapter(session):
+    """
+    Mounts a connection pool of the configured size onto given session
+    Its connections record phase timings, see obp.timings
+    """
+    adapter = TimedHTTPAdapter(
+        pool_connections=settings.API_POOL_CONNECTIONS,
+        pool_maxsize=settings.API_POOL_SIZE,
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class SessionPool(object):
+    """
+    Thread-safe registry of sessions with idle eviction
+    A session counts as used when it is handed out and whenever API.call
+    uses it, so sessions kept by a long run are not evicted under it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def make_key(self, session_data):
+        """Builds a hashable registry key from session data"""
+        if not session_data or 'authenticator' not in session_data or\
+                'authenticator_kwargs' not in session_data:
+            return None
+        kwargs = session_data['authenticator_kwargs'] or {}
+        return (
+            session_data['authenticator'],
+            tuple(sorted((k, str(v)) for k, v in kwargs.items())),
+        )
+
+    def create(self, session_data):
+        """Creates a new session for given session data"""
+        if self.make_key(session_data) is None:
+            return mount_adapter(requests.Session())
+        cls = get_authenticator_class(session_data['authenticator'])
+        LOGGER.log(logging.INFO, 'Authenticator {}'.format(cls.__name__))
+        authenticator = cls(**session_data['authenticator_kwargs'])
+        return mount_adapter(authenticator.get_session())
+
+    def get(self, session_data=None):
+        """
+        Returns the pooled session for given session data, creating it if
+        necessary. Session data without authenticator yields a shared
+        anonymous session.
+        """
+        key = self.make_key(session_data)
+        now = time.monotonic()
+        with self.lock:
+            self.evict_idle(now)
+            session = self.sessions.get(key)
+            if session is None:
+                session = self.create(session_data)
+                self.sessions[key] = session
+                metrics.POOLED_SESSIONS.inc()
+            session.last_used = now
+            return session
+
+    def touch(self, session):
+        """Marks given session as used"""
+        session.last_used = time.monotonic()
+
+    def evict_idle(self, now=None):
+        """Closes sessions which have not been used within the idle timeout"""
+        now = now or time.monotonic()
+        timeout = settings.API_SESSION_IDLE_TIMEOUT
+        for key, session in list(self.sessions.items()):
+            if now - session.last_used > timeout:
+                session.close()
+                del self.sessions[key]
+                metrics.POOLED_SESSIONS.dec()
+
+    def discard(self, session_data):
+        """Closes and forgets the session for given session data, e.g. on logout"""
+        key = self.make_key(session_data)
+        with self.lock:
+            session = self.sessions.pop(key, None)
+        if session is not None:
+            session.close()
+            metrics.POOLED_SESSIONS.dec()
+
+    def clear(self):
+        """Closes all sessions"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            metrics.POOLED_SESSIONS.dec(len(self.sessions))
+            self.sessions.clear()
+
+
+pool = SessionPool()
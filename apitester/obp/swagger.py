@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+Swagger store shared by all worker processes
+
+Resource docs are kept in the `swagger` cache (file-based by default) and
+revalidated against the API with ETag/Last-Modified once they are older
+than CACHE_TIMEOUT. If the API ignores conditional requests, the body's
+content hash is compared instead, so an unchanged document is never parsed
+again. Parsed documents are additionally kept per process.
+
+Refreshes are single-flight: a lock file per document in SWAGGER_LOCK_DIR
+makes sure only one caller across all processes of a host fetches it at a
+time, while the others are served the stale copy or wait for the result.
+The lock is an flock, so the kernel releases it if its process dies and
+only its holder can release it.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of parsed documents each process keeps in memory
+PARSED_MAX_ENTRIES = 8
+# Seconds between checks whether another process finished a refresh
+LOCK_POLL_INTERVAL = 0.1
+
+
+def get_definition_name(operation):
+    """
+    Returns the name of the request body definition of given operation,
+    e.g. BankJson400 for a $ref of #/definitions/BankJson400
+    """
+    for parameter in operation.get('parameters') or []:
+        ref = (parameter.get('schema') or {}).get('$ref')
+        if ref:
+            return ref.rsplit('/', 1)[-1]
+    return None
+
+
+def build_index(swagger):
+    """
+    Builds a lookup of operationId to path, method, summary, name of the
+    request body definition and declared success status codes
+    """
+    index = {}
+    if not isinstance(swagger, dict):
+        return index
+    for path, operations in swagger.get('paths', {}).items():
+        for method, operation in operations.items():
+            if not isinstance(operation, dict) or 'operationId' not in operation:
+                continue
+            status_codes = sorted(
+                int(code) for code in operation.get('responses') or {}
+                if str(code).isdigit() and str(code).startswith('2'))
+            index[operation['operationId']] = {
+                'path': path,
+                'method': method,
+                'summary': operation.get('summary', ''),
+                'definition': get_definition_name(operation),
+                'status_codes': status_codes,
+            }
+    return index
+
+
+class SwaggerStore(object):
+    """Cross-process store for swagger documents with revalidation"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.parsed = OrderedDict()
+        self.inflight = {}
+        self.locks = {}
+        self.indexes = OrderedDict()
+
+    @property
+    def cache(self):
+        return caches[settings.SWAGGER_CACHE]
+
+    def lock_path(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(settings.SWAGGER_LOCK_DIR, '{}.lock'.format(digest))
+
+    def try_lock(self, url):
+        """
+        Returns the open lock file of given url if the lock was free, None
+        if another caller holds it. Closing the file releases the lock.
+        """
+        os.makedirs(settings.SWAGGER_LOCK_DIR, exist_ok=True)
+        handle = open(self.lock_path(url), 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    def meta_key(self, url):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return 'swagger:meta:{}'.format(digest)
+
+    def index_key(self, digest):
+        return 'swagger:index:{}'.format(digest)
+
+    def body_key(self, digest):
+        return 'swagger:body:{}'.format(digest)
+
+    def remember(self, digest, swagger):
+        """Keeps a parsed document in this process"""
+        with self.lock:
+            self.parsed[digest] = swagger
+            self.parsed.move_to_end(digest)
+            while len(self.parsed) > PARSED_MAX_ENTRIES:
+                self.parsed.popitem(last=False)
+        return swagger
+
+    def get_digest(self, swagger):
+        """
+        Returns the content hash of a document loaded by this store, None if
+        the document is unknown, e.g. because it is an error document
+        """
+        with self.lock:
+            for digest, document in self.parsed.items():
+                if document is swagger:
+                    return digest
+        return None
+
+    def load_index(self, digest, swagger=None):
+        """
+        Loads the operation index of a document by content hash, from this
+        process or the store. Builds it from given document if missing.
+        """
+        with self.lock:
+            if digest in self.indexes:
+                self.indexes.move_to_end(digest)
+                return self.indexes[digest]
+        index = self.cache.get(self.index_key(digest))
+        if index is None:
+            if swagger is None:
+                return None
+            index = build_index(swagger)
+            self.cache.set(self.index_key(digest), index)
+        with self.lock:
+            self.indexes[digest] = index
+            while len(self.indexes) > PARSED_MAX_ENTRIES:
+                self.indexes.popitem(last=False)
+        return index
+
+    def load(self, digest):
+        """Loads a document by content hash, from this process or the store"""
+        with self.lock:
+            if digest in self.parsed:
+                self.parsed.move_to_end(digest)
+                return self.parsed[digest]
+        swagger = self.cache.get(self.body_key(digest))
+        if swagger is not None:
+            self.remember(digest, swagger)
+        return swagger
+
+    def get_headers(self, meta):
+        """Returns conditional request headers for stored meta data"""
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def save(self, url, meta, response, digest):
+        meta.update({
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'digest': digest,
+            'checked': time.time(),
+        })
+        self.cache.set(self.meta_key(url), meta)
+
+    def lookup(self, url):
+        """Returns stored meta data and document for given url"""
+        meta = self.cache.get(self.meta_key(url)) or {}
+        swagger = None
+        if meta:
+            swagger = self.load(meta['digest'])
+        return meta, swagger
+
+    def begin(self, url):
+        """
+        Claims the refresh of given url for this caller
+        Returns the in-flight future if claimed, None if somebody else in
+        this or another process is already refreshing it
+        """
+        with self.lock:
+            if url in self.inflight:
+                return None
+            handle = self.try_lock(url)
+            if handle is None:
+                return None
+            future = Future()
+            self.inflight[url] = future
+            self.locks[url] = handle
+            return future
+
+    def end(self, url):
+        """Releases the refresh of given url"""
+        with self.lock:
+            self.inflight.pop(url, None)
+            handle = self.locks.pop(url, None)
+        if handle is not None:
+            handle.close()
+
+    def refresh(self, api, url, meta, swagger):
+        """
+        Revalidates or downloads the document at given url
+        Only parses it if it has changed compared to given stored copy
+        """
+        headers = self.get_headers(meta) if swagger is not None else None
+        response = api.call('GET', url, headers=headers)
+        if response.status_code == 304:
+            meta['checked'] = time.time()
+            self.cache.set(self.meta_key(url), meta)
+            return swagger
+
+        digest = hashlib.sha256(response.content).hexdigest()
+        if swagger is not None and digest == meta['digest']:
+            self.save(url, meta, response, digest)
+            return swagger
+
+        swagger = api.handle_response(response)
+        # Do not persist error documents, e.g. unknown API versions
+        if isinstance(swagger, dict) and 'paths' in swagger:
+            self.cache.set(self.body_key(digest), swagger)
+            self.save(url, {}, response, digest)
+            self.remember(digest, swagger)
+        return swagger
+
+    def run(self, future, api, url, meta, swagger):
+        """Refreshes given url and hands the outcome to waiting callers"""
+        try:
+            result = self.refresh(api, url, meta, swagger)
+        except Exception as err:
+            future.set_exception(err)
+        else:
+            future.set_result(result)
+        finally:
+            self.end(url)
+
+    def revalidate_in_background(self, api, url, meta, swagger):
+        future = self.begin(url)
+        if future is None:
+            return
+        thread = threading.Thread(
+            target=self.run, args=(future, api, url, meta, swagger))
+        thread.daemon = True
+        thread.start()
+        # Only logged, the stale copy keeps being served
+        future.add_done_callback(self.log_failure)
+
+    def log_failure(self, future):
+        if future.exception() is not None:
+            LOGGER.log(logging.ERROR, 'Swagger refresh failed: {}'.format(
+                future.exception()))
+
+    def wait(self, url):
+        """
+        Waits for a refresh of given url by somebody else
+        Returns the document or None if it did not become available
+        """
+        with self.lock:
+            future = self.inflight.get(url)
+        if future is not None:
+            try:
+                return future.result(timeout=settings.SWAGGER_LOCK_TIMEOUT)
+            except TimeoutError:
+                # Fall back to whatever is stored, else refresh ourselves
+                LOGGER.log(logging.WARNING, 'Swagger refresh of {} took longer '
+                           'than {} s'.format(url, settings.SWAGGER_LOCK_TIMEOUT))
+                return self.lookup(url)[1]
+        # Refreshed by another process: poll until it releases its lock
+        deadline = time.monotonic() + settings.SWAGGER_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            handle = self.try_lock(url)
+            if handle is not None:
+                handle.close()
+                break
+            time.sleep(LOCK_POLL_INTERVAL)
+        return self.lookup(url)[1]
+
+    def get(self, api, urlpath):
+        """
+        Returns the swagger document at given urlpath
+
+        A stale copy is served right away while a single background refresh
+        revalidates it. Without any copy, only one caller per url downloads
+        the document and everybody else waits for its result.
+        """
+        url = settings.API_ROOT + urlpath
+        meta, swagger = self.lookup(url)
+        if swagger is not None:
+            if time.time() - meta['checked'] >= settings.CACHE_TIMEOUT:
+                self.revalidate_in_background(api, url, meta, swagger)
+            return swagger
+
+        future = self.begin(url)
+        if future is None:
+            swagger = self.wait(url)
+            if swagger is not None:
+                return swagger
+            # Whoever refreshed did not store anything, e.g. an error
+            return self.refresh(api, url, {}, None)
+        self.run(future, api, url, {}, None)
+        return future.result()
+
+    def get_index(self, api, urlpath):
+        """
+        Returns the operation index of the swagger document at given urlpath
+        While the document is fresh, the raw document is not loaded at all.
+        """
+        url = settings.API_ROOT + urlpath
+        meta = self.cache.get(self.meta_key(url)) or {}
+        if meta and time.time() - meta['checked'] < settings.CACHE_TIMEOUT:
+            index = self.load_index(meta['digest'])
+            if index is not None:
+                return index
+        swagger = self.get(api, urlpath)
+        meta = self.cache.get(self.meta_key(url)) or {}
+        if not meta:
+            # Not stored, e.g. an error document
+            return build_index(swagger)
+        return self.load_index(meta['digest'], swagger)
+
+
+swagger_store = SwaggerStore()
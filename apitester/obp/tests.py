@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for OBP app
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from prometheus_client import REGISTRY
+import requests
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import calllog, metrics
+from .api import API, APIError
+from .identity import get_api_user, store_api_user
+from .sessionpool import SessionPool, mount_adapter
+from .swagger import SwaggerStore, build_index
+from .versions import VersionCatalogue
+
+
+DIRECTLOGIN = {
+    'authenticator': 'obp.directlogin.DirectLoginAuthenticator',
+    'authenticator_kwargs': {'token': 'abc'},
+}
+
+
+class SessionPoolTest(SimpleTestCase):
+    def test_reuses_session_for_same_credentials(self):
+        pool = SessionPool()
+        session = pool.get(DIRECTLOGIN)
+        self.assertIs(session, pool.get(dict(DIRECTLOGIN)))
+        self.assertEqual(
+            session.headers['Authorization'], 'DirectLogin token=abc')
+
+    def test_separates_credentials(self):
+        pool = SessionPool()
+        other = {
+            'authenticator': DIRECTLOGIN['authenticator'],
+            'authenticator_kwargs': {'token': 'xyz'},
+        }
+        self.assertIsNot(pool.get(DIRECTLOGIN), pool.get(other))
+        self.assertIsNot(pool.get(DIRECTLOGIN), pool.get())
+
+    @override_settings(API_SESSION_IDLE_TIMEOUT=-1)
+    def test_evicts_idle_sessions(self):
+        pool = SessionPool()
+        session = pool.get(DIRECTLOGIN)
+        self.assertIsNot(session, pool.get(DIRECTLOGIN))
+
+    def test_keeps_sessions_used_by_calls(self):
+        pool = SessionPool()
+        session = pool.get(DIRECTLOGIN)
+        with self.settings(API_SESSION_IDLE_TIMEOUT=60):
+            session.last_used -= 120
+            pool.touch(session)
+            pool.evict_idle()
+            self.assertIs(pool.get(DIRECTLOGIN), session)
+
+
+class LogoutViewTest(TestCase):
+    def test_discards_pooled_session(self):
+        session = self.client.session
+        session['obp'] = DIRECTLOGIN
+        session.save()
+        with mock.patch('obp.views.pool') as pool:
+            self.client.get(reverse('oauth-logout'))
+        pool.discard.assert_called_once_with(DIRECTLOGIN)
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TimingsTest(SimpleTestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), OkHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_records_phases_and_reuse(self):
+        api = API()
+        api.session = mount_adapter(requests.Session())
+        url = 'http://localhost:{}/'.format(self.server.server_port)
+        first = api.call('GET', url).timings
+        second = api.call('GET', url).timings
+        api.session.close()
+        self.assertFalse(first['reused'])
+        self.assertGreater(first['connect'], 0)
+        self.assertTrue(second['reused'])
+        self.assertEqual((second['dns'], second['connect']), (0, 0))
+        for timings in (first, second):
+            self.assertAlmostEqual(
+                timings['total'],
+                timings['dns'] + timings['connect'] + timings['tls'] +
+                timings['ttfb'] + timings['transfer'],
+                delta=0.01)
+
+
+class MetricsTest(SimpleTestCase):
+    def test_labels(self):
+        self.assertEqual(
+            metrics.get_api_version('http://127.0.0.1:8080/obp/v4.0.0/banks'), 'v4.0.0')
+        self.assertEqual(metrics.get_api_version('http://127.0.0.1:8080/my/logins'), 'unknown')
+        self.assertEqual(metrics.get_status_class(204), '2xx')
+        self.assertEqual(metrics.get_status_class(None), 'error')
+
+    def test_exposes_calls(self):
+        metrics.observe(
+            'get', 'http://127.0.0.1:8080/obp/v4.0.0/banks', 404, 0.02,
+            'OBPv4.0.0-getBanks')
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'apitester_api_calls_total{api_version="v4.0.0",method="GET",'
+            'operation_id="OBPv4.0.0-getBanks",status_class="4xx"}',
+            response.content.decode('utf-8'))
+        with self.settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    def test_labels_api_version_of_profile(self):
+        metrics.observe(
+            'post', 'http://127.0.0.1:8080/berlin-group/v1.3/consents', 201, 0.02,
+            'BGv1.3-createConsent', 'BGv1.3')
+        response = self.client.get(reverse('metrics'))
+        self.assertIn(
+            'apitester_api_calls_total{api_version="BGv1.3",method="POST",'
+            'operation_id="BGv1.3-createConsent",status_class="2xx"}',
+            response.content.decode('utf-8'))
+
+
+class CallLogTest(SimpleTestCase):
+    def get_record(self, **kwargs):
+        record = logging.LogRecord(
+            'obp.calls', logging.INFO, __file__, 0, 'API call', None, None)
+        record.call = dict({
+            'correlation_id': 'abc', 'method': 'POST', 'url': '/banks',
+            'status_code': 201, 'execution_time': 12, 'timings': None,
+            'payload': None,
+        }, **kwargs)
+        return record
+
+    @override_settings(API_LOG_PAYLOAD_MAX_LENGTH=10)
+    def test_formats_json_with_truncated_payload(self):
+        record = self.get_record(payload={'name': 'x' * 100})
+        data = json.loads(calllog.JSONFormatter().format(record))
+        self.assertEqual(data['correlation_id'], 'abc')
+        self.assertEqual(data['status_code'], 201)
+        self.assertEqual(data['payload'], '{"name": "... (112 characters)')
+
+    def test_samples_payloads(self):
+        with self.settings(API_LOG_PAYLOAD_SAMPLE_RATE=0):
+            self.assertIsNone(calllog.sample_payload({'a': 1}))
+        with self.settings(API_LOG_PAYLOAD_SAMPLE_RATE=1):
+            self.assertEqual(calllog.sample_payload({'a': 1}), {'a': 1})
+
+    def test_writes_from_listener_and_drops_when_full(self):
+        stream = io.StringIO()
+        handler = calllog.QueuedHandler(stream=stream, queue_size=1)
+        handler.handle(self.get_record())
+        handler.close()
+        self.assertEqual(json.loads(stream.getvalue())['url'], '/banks')
+
+        # Without a listener nothing takes records off the queue
+        handler = calllog.QueuedHandler(stream=stream, queue_size=1)
+        handler.pid = os.getpid()
+        dropped = REGISTRY.get_sample_value('apitester_call_log_dropped_total')
+        handler.handle(self.get_record())
+        handler.handle(self.get_record())
+        self.assertEqual(
+            REGISTRY.get_sample_value('apitester_call_log_dropped_total'),
+            dropped + 1)
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(data).encode('utf-8') if data else b''
+        self.text = self.content.decode('utf-8')
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class FakeAPI(API):
+    """Answers calls from a list of responses and records request headers"""
+    def __init__(self, responses):
+        super(FakeAPI, self).__init__()
+        self.responses = list(responses)
+        self.requests = []
+
+    def call(self, method='GET', url='', payload=None, headers=None):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+class BlockingAPI(FakeAPI):
+    """Holds every call until released"""
+    def __init__(self, released, responses):
+        super(BlockingAPI, self).__init__(responses)
+        self.released = released
+
+    def call(self, method='GET', url='', payload=None, headers=None):
+        self.released.wait(5)
+        return super(BlockingAPI, self).call(method, url, payload, headers)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'swagger': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'swagger-test',
+    },
+})
+class SwaggerStoreTest(SimpleTestCase):
+    swagger = {'paths': {'/banks': {}}}
+
+    def setUp(self):
+        caches['swagger'].clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        lock_dir = self.settings(SWAGGER_LOCK_DIR=directory.name)
+        lock_dir.enable()
+        self.addCleanup(lock_dir.disable)
+
+    url = 'http://127.0.0.1:8080/obp/v5.1.0/resource-docs/OBPv5.1.0/swagger?'
+
+    def test_locks_across_stores(self):
+        # Stores of other worker processes share the lock files
+        first, second = SwaggerStore(), SwaggerStore()
+        self.assertIsNotNone(first.begin(self.url))
+        self.assertIsNone(second.begin(self.url))
+        # Only the holder releases the lock
+        second.end(self.url)
+        self.assertIsNone(second.begin(self.url))
+        first.end(self.url)
+        self.assertIsNotNone(second.begin(self.url))
+        second.end(self.url)
+
+    def test_revalidates_with_etag(self):
+        api = FakeAPI([
+            FakeResponse(200, self.swagger, {'ETag': '"v1"'}),
+            FakeResponse(304),
+        ])
+        store = SwaggerStore()
+        first = store.refresh(api, self.url, {}, None)
+        meta, swagger = store.lookup(self.url)
+        self.assertIs(store.refresh(api, self.url, meta, swagger), first)
+        self.assertEqual(api.requests, [None, {'If-None-Match': '"v1"'}])
+
+    def test_compares_content_hash_without_etag(self):
+        api = FakeAPI([
+            FakeResponse(200, self.swagger),
+            FakeResponse(200, self.swagger),
+        ])
+        store = SwaggerStore()
+        first = store.refresh(api, self.url, {}, None)
+        meta, swagger = store.lookup(self.url)
+        self.assertIs(store.refresh(api, self.url, meta, swagger), first)
+
+    def test_serves_fresh_copy_without_request(self):
+        api = FakeAPI([FakeResponse(200, self.swagger)])
+        store = SwaggerStore()
+        store.get(api, '/resource-docs/OBPv5.1.0/swagger?')
+        self.assertEqual(
+            store.get(api, '/resource-docs/OBPv5.1.0/swagger?'), self.swagger)
+        self.assertEqual(len(api.requests), 1)
+
+    @override_settings(SWAGGER_LOCK_TIMEOUT=0.05)
+    def test_refreshes_itself_if_waiting_times_out(self):
+        store = SwaggerStore()
+        # A refresh which never finishes
+        self.assertIsNotNone(store.begin(self.url))
+        self.addCleanup(store.end, self.url)
+        api = FakeAPI([FakeResponse(200, self.swagger)])
+        with self.assertLogs('obp.swagger', 'WARNING'):
+            self.assertEqual(
+                store.get(api, '/resource-docs/OBPv5.1.0/swagger?'), self.swagger)
+
+    @override_settings(CACHE_TIMEOUT=-1)
+    def test_serves_stale_copy_during_single_refresh(self):
+        store = SwaggerStore()
+        store.refresh(FakeAPI([FakeResponse(200, self.swagger)]), self.url, {}, None)
+        released = threading.Event()
+        api = BlockingAPI(released, [FakeResponse(304)])
+        for _ in range(3):
+            self.assertEqual(
+                store.get(api, '/resource-docs/OBPv5.1.0/swagger?'), self.swagger)
+        future = store.inflight[self.url]
+        released.set()
+        future.result(timeout=5)
+        self.assertEqual(len(api.requests), 1)
+
+
+class BuildIndexTest(SimpleTestCase):
+    def test_indexes_operations(self):
+        swagger = {'paths': {'/banks': {
+            'get': {'operationId': 'OBPv5.1.0-getBanks', 'summary': 'Get Banks',
+                    'responses': {'200': {}}},
+            'post': {'operationId': 'OBPv5.1.0-createBank', 'summary': 'Create Bank',
+                     'parameters': [{'schema': {'$ref': '#/definitions/BankJson400'}}],
+                     'responses': {'201': {}, '400': {}}},
+        }}}
+        index = build_index(swagger)
+        self.assertEqual(index['OBPv5.1.0-createBank'], {
+            'path': '/banks',
+            'method': 'post',
+            'summary': 'Create Bank',
+            'definition': 'BankJson400',
+            'status_codes': [201],
+        })
+        self.assertIsNone(index['OBPv5.1.0-getBanks']['definition'])
+
+
+class FakeRequest(object):
+    def __init__(self):
+        self.session = {}
+
+
+class ApiUserTest(SimpleTestCase):
+    def test_uses_session_until_expired(self):
+        request = FakeRequest()
+        store_api_user(request, {'user_id': '1', 'username': 'alice'})
+        with mock.patch('obp.identity.API.get') as get:
+            self.assertEqual(get_api_user(request)['username'], 'alice')
+            self.assertFalse(get.called)
+            get.return_value = {'user_id': '1', 'username': 'bob'}
+            self.assertEqual(get_api_user(request, refresh=True)['username'], 'bob')
+            with override_settings(API_USER_TTL=-1):
+                get.return_value = {'user_id': '1', 'username': 'carol'}
+                self.assertEqual(get_api_user(request)['username'], 'carol')
+
+
+class VersionCatalogueTest(SimpleTestCase):
+    def test_fetches_once_and_lists_standards(self):
+        api = mock.Mock()
+        api.get.return_value = {'scanned_api_versions': [
+            {'API_VERSION': 'OBPv5.1.0'},
+            {'API_VERSION': 'BGv1.3'},
+            {'API_VERSION': 'OBPv4.0.0'},
+        ]}
+        catalogue = VersionCatalogue()
+        self.assertEqual(
+            catalogue.get_versions(api), ['BGv1.3', 'OBPv4.0.0', 'OBPv5.1.0'])
+        self.assertEqual(catalogue.get_standards(api), ['BG', 'OBP'])
+        self.assertEqual(catalogue.get_choices(api)[1], ('BGv1.3', 'BGv1.3'))
+        self.assertEqual(api.get.call_count, 1)
+
+    def test_does_not_cache_malformed_responses(self):
+        api = mock.Mock()
+        api.get.return_value = {'code': 500, 'message': 'OBP-50000: Unknown Error.'}
+        catalogue = VersionCatalogue()
+        with self.assertRaises(APIError):
+            catalogue.get_versions(api)
+        self.assertIsNone(catalogue.versions)
+        api.get.return_value = {'scanned_api_versions': [{'API_VERSION': 'BGv1.3'}]}
+        self.assertEqual(catalogue.get_versions(api), ['BGv1.3'])
+        # The previous copy is kept if a refresh finds no versions
+        api.get.return_value = {'scanned_api_versions': []}
+        catalogue.refresh(api)
+        self.assertEqual(catalogue.versions, ['BGv1.3'])
+
+    @override_settings(API_VERSIONS_FALLBACK=['OBPv5.1.0', 'BGv1.3'])
+    def test_falls_back_to_last_or_built_in_versions(self):
+        catalogue = VersionCatalogue()
+        self.assertEqual(catalogue.get_fallback_versions(), ['BGv1.3', 'OBPv5.1.0'])
+        catalogue.versions = ['OBPv4.0.0']
+        self.assertEqual(catalogue.get_fallback_versions(), ['OBPv4.0.0'])
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Phase timings of calls to the OBP API
+
+The connection classes mounted by the session pool record how long name
+resolution, the TCP connect and the TLS handshake of a new connection take
+into a timer of the calling thread. API.call adds the time to the first
+byte of the response and the body transfer. A call which recorded no
+connect reused a keep-alive connection.
+
+All timings are in milliseconds, measured with time.perf_counter.
+"""
+
+import socket
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+LOCAL = threading.local()
+
+
+def elapsed(start, end):
+    return round((end - start) * 1000, 3)
+
+
+class PhaseTimer(object):
+    """Collects the phases of one call"""
+
+    def __init__(self):
+        self.dns = 0.0
+        self.connect = 0.0
+        self.tls = 0.0
+        self.reused = True
+
+    def finish(self, start, headers, end):
+        """
+        Returns the timings given the start of the call, the arrival of the
+        response headers and the end of the body transfer
+        """
+        total = elapsed(start, end)
+        setup = self.dns + self.connect + self.tls
+        return {
+            'dns': self.dns,
+            'connect': self.connect,
+            'tls': self.tls,
+            # Sending the request and waiting for the server
+            'ttfb': round(max(0.0, elapsed(start, headers) - setup), 3),
+            'transfer': elapsed(headers, end),
+            'total': total,
+            'reused': self.reused,
+        }
+
+
+def start():
+    """Starts timing a call in this thread"""
+    LOCAL.timer = PhaseTimer()
+    return LOCAL.timer
+
+
+def stop():
+    """Stops timing calls in this thread"""
+    LOCAL.timer = None
+
+
+def get_timer():
+    """Returns the timer of the call in this thread, None outside of calls"""
+    return getattr(LOCAL, 'timer', None)
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """Records name resolution and connect time of new connections"""
+
+    def _new_conn(self):
+        timer = get_timer()
+        if timer is None:
+            return super(TimedHTTPConnection, self)._new_conn()
+        timer.reused = False
+        dns_host = self._dns_host
+        time_start = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(
+                dns_host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror:
+            # Let urllib3 raise its own error
+            addresses = [None]
+        time_resolved = time.perf_counter()
+        timer.dns = elapsed(time_start, time_resolved)
+        try:
+            for index, address in enumerate(addresses):
+                if address is not None:
+                    # Connect to the resolved address, Host and SNI still
+                    # use self.host
+                    self._dns_host = address[4][0]
+                try:
+                    sock = super(TimedHTTPConnection, self)._new_conn()
+                    break
+                except Exception:
+                    if index == len(addresses) - 1:
+                        raise
+        finally:
+            self._dns_host = dns_host
+            timer.connect = elapsed(time_resolved, time.perf_counter())
+        return sock
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    """Additionally records the TLS handshake of new connections"""
+
+    def connect(self):
+        timer = get_timer()
+        time_start = time.perf_counter()
+        super(TimedHTTPSConnection, self).connect()
+        if timer is not None:
+            total = elapsed(time_start, time.perf_counter())
+            timer.tls = round(max(0.0, total - timer.dns - timer.connect), 3)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record their phase timings"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Catalogue of the API versions the API knows about
+
+Fetched from /api/versions once and shared by all forms and views of a
+process. Once older than VERSIONS_TIMEOUT it keeps being served while a
+background thread refreshes it. Failed or empty responses are not cached.
+"""
+
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+
+
+LOGGER = logging.getLogger(__name__)
+
+# e.g. OBPv5.1.0 -> OBP, BGv1.3 -> BG
+STANDARD_PATTERN = re.compile(r'^(.*?)v\d')
+
+
+def make_choices(versions):
+    """Returns given API versions as form choices"""
+    choices = [('', ('Choose ...'))]
+    for version in versions:
+        choices.append((version, version))
+    return choices
+
+
+class VersionCatalogue(object):
+    """TTL cache of /api/versions with background refresh"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = None
+        self.fetched = 0
+        self.refreshing = False
+
+    def fetch(self, api):
+        """
+        Fetches the API versions, raises APIError on a response without any
+        so that an error is never cached in place of the catalogue
+        """
+        # obp.api imports this module
+        from .api import APIError
+        result = api.get('/api/versions')
+        try:
+            versions = sorted(
+                version['API_VERSION'] for version in result['scanned_api_versions'])
+        except (KeyError, TypeError):
+            versions = []
+        if not versions:
+            raise APIError('No API versions in response: {}'.format(result))
+        with self.lock:
+            self.versions = versions
+            self.fetched = time.time()
+        return versions
+
+    def refresh(self, api):
+        try:
+            self.fetch(api)
+        except Exception as err:
+            # Keep serving the previous copy
+            LOGGER.log(logging.ERROR, 'API versions refresh failed: {}'.format(err))
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def get_fallback_versions(self):
+        """
+        Returns the versions to offer if they cannot be fetched: the last
+        fetched ones, else API_VERSIONS_FALLBACK
+        """
+        with self.lock:
+            return self.versions or sorted(settings.API_VERSIONS_FALLBACK)
+
+    def get_versions(self, api):
+        """
+        Returns the sorted API versions, e.g. OBPv5.1.0
+        Lets APIError bubble up if there is no copy yet
+        """
+        with self.lock:
+            versions = self.versions
+            expired = time.time() - self.fetched > settings.VERSIONS_TIMEOUT
+            start = versions is not None and expired and not self.refreshing
+            if start:
+                self.refreshing = True
+        if versions is None:
+            return self.fetch(api)
+        if start:
+            thread = threading.Thread(target=self.refresh, args=(api,))
+            thread.daemon = True
+            thread.start()
+        return versions
+
+    def get_choices(self, api):
+        """Gets the API versions as used by form choices"""
+        return make_choices(self.get_versions(api))
+
+    def get_standards(self, api):
+        """Gets the known standards, e.g. OBP, BG or MXOF"""
+        standards = set()
+        for version in self.get_versions(api):
+            match = STANDARD_PATTERN.match(version)
+            if match:
+                standards.add(match.group(1))
+        return sorted(standards)
+
+
+catalogue = VersionCatalogue()
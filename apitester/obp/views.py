@@ -16,7 +16,9 @@ from django.conf import settings
 from .api import API, APIError
 from .authenticator import AuthenticatorError
 from .forms import DirectLoginForm, GatewayLoginForm
+from .identity import store_api_user
 from .oauth import OAuthAuthenticator
+from .sessionpool import pool
 
 
 class LoginToDjangoMixin(object):
@@ -33,6 +35,7 @@ class LoginToDjangoMixin(object):
             messages.error(self.request, err)
             return False
         else:
+            store_api_user(self.request, data)
             userid = data['user_id'] or data['email']
             username = hashlib.sha256(userid.encode('utf-8')).hexdigest()
             password = username
@@ -155,7 +158,9 @@ class LogoutView(RedirectView):
     """View to logout"""
 
     def get_redirect_url(self, *args, **kwargs):
+        # logout() flushes the session
+        session_data = self.request.session.get('obp')
         logout(self.request)
-        if 'obp' in self.request.session:
-            del self.request.session['obp']
+        if session_data is not None:
+            pool.discard(session_data)
         return reverse('home')
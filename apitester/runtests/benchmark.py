@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Offline micro-benchmarks of the hot paths of the tester
+
+Resource docs of the supported standards are checked in below
+benchmark_docs/, `manage.py benchmark --record` replaces them with the
+current ones of API_HOST. Each document is scaled to the benchmarked number
+of operations by copying its operations under new paths and operation ids,
+and its definitions under new names.
+
+The checked-in docs are small hand-written samples until they are recorded,
+and the one of OBPv5.1.0 is the one of OBPv4.0.0 with other version numbers.
+Reports list size and origin of the docs they are based on in documents.
+
+Every benchmark is timed repeatedly and reported in milliseconds, so the
+JSON reports of two releases can be compared with find_regressions.
+Profile creation and index rendering need a database, the management
+command runs them in a throwaway test database.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import re
+import statistics
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from obp.identity import SESSION_KEY
+from obp.swagger import build_index, get_definition_name, swagger_store
+
+from . import bodies
+from .models import ProfileOperation, TestConfiguration
+from .urlpaths import UrlpathExpander
+from .views import get_profile_operations, profileOperation_bulk_insert
+
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_docs')
+
+# API versions with checked-in resource docs
+API_VERSIONS = ['OBPv4.0.0', 'OBPv5.1.0', 'BGv1.3', 'MXOFv0.0.1']
+
+# Numbers of operations every document is scaled to
+SIZES = [100, 1000, 5000]
+
+BENCHMARKS = [
+    'swagger_parsing',
+    'urlpath_expansion',
+    'body_generation',
+    'profile_creation',
+    'index_rendering',
+]
+
+
+def get_document_path(api_version):
+    return os.path.join(DOCS_DIR, '{}.json'.format(api_version))
+
+
+def load_document(api_version):
+    """Returns the checked-in resource docs of given API version"""
+    with open(get_document_path(api_version)) as handle:
+        return json.load(handle)
+
+
+def record_document(api, api_version):
+    """Replaces the checked-in resource docs by the current ones of the API"""
+    swagger = api.get_swagger(api_version)
+    if 'paths' not in swagger:
+        raise ValueError('No resource docs for {}: {}'.format(
+            api_version, swagger.get('message')))
+    # Tells recorded docs from hand-written ones in the reports
+    swagger = dict(swagger, **{'x-recorded': timezone.now().isoformat()})
+    with open(get_document_path(api_version), 'w') as handle:
+        json.dump(swagger, handle, indent=1, sort_keys=True)
+        handle.write('\n')
+
+
+def rename_refs(value, suffix):
+    """Returns a copy of value with suffix appended to its definition $refs"""
+    if isinstance(value, dict):
+        return {
+            key: '{}{}'.format(item, suffix)
+            if key == '$ref' and isinstance(item, str) else rename_refs(item, suffix)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [rename_refs(item, suffix) for item in value]
+    return value
+
+
+def scale_document(swagger, size):
+    """
+    Returns a copy of given document with exactly size operations, the
+    original ones repeated under paths and operation ids with a suffix
+    Every copy refers to its own copy of the definitions, so request bodies
+    are compiled per copy as for a document of that size.
+    """
+    operations = [
+        (path, method, operation)
+        for path, methods in sorted(swagger['paths'].items())
+        for method, operation in sorted(methods.items())
+    ]
+    definitions = swagger.get('definitions') or {}
+    paths = {}
+    copies = {}
+    for index in range(size):
+        copy, position = divmod(index, len(operations))
+        path, method, operation = operations[position]
+        if copy:
+            suffix = 'Copy{}'.format(copy)
+            path = '{}/copy-{}'.format(path, copy)
+            operation = dict(
+                rename_refs(operation, suffix),
+                operationId='{}-{}'.format(operation['operationId'], copy))
+            if copy not in copies:
+                copies[copy] = {
+                    '{}{}'.format(name, suffix): rename_refs(definition, suffix)
+                    for name, definition in definitions.items()
+                }
+        paths.setdefault(path, {})[method] = operation
+    scaled = dict(definitions)
+    for renamed in copies.values():
+        scaled.update(renamed)
+    return dict(swagger, paths=paths, definitions=scaled)
+
+
+def get_fingerprint(swagger):
+    """
+    Returns a digest of given document ignoring digits, equal for documents
+    which only differ in their version numbers
+    """
+    content = json.dumps(swagger, sort_keys=True)
+    return hashlib.sha1(re.sub(r'\d', '', content).encode('utf-8')).hexdigest()
+
+
+def describe_documents(api_versions):
+    """
+    Returns the size and origin of the resource docs of given API versions,
+    so a report tells how much its numbers say about real resource docs
+    Docs never recorded from an API are hand-written samples, documents
+    which only differ in version numbers name each other in same_as.
+    """
+    documents = {}
+    fingerprints = {}
+    for api_version in api_versions:
+        swagger = load_document(api_version)
+        fingerprint = get_fingerprint(swagger)
+        fingerprints.setdefault(fingerprint, []).append(api_version)
+        documents[api_version] = {
+            'operations': sum(len(methods) for methods in swagger['paths'].values()),
+            'definitions': len(swagger.get('definitions') or {}),
+            'recorded': swagger.get('x-recorded'),
+            'fingerprint': fingerprint,
+        }
+    for api_version, document in documents.items():
+        document['same_as'] = [
+            other for other in fingerprints[document.pop('fingerprint')]
+            if other != api_version
+        ]
+    return documents
+
+
+def measure(function, repeat, setup=None):
+    """
+    Returns min, median and max milliseconds of repeated calls of function,
+    given the result of setup which is not timed
+    A first call warms up caches, e.g. of templates, and is not counted.
+    """
+    function(setup() if setup is not None else None)
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        time_start = time.perf_counter()
+        function(argument)
+        times.append((time.perf_counter() - time_start) * 1000)
+    return {
+        'min': round(min(times), 3),
+        'median': round(statistics.median(times), 3),
+        'max': round(max(times), 3),
+    }
+
+
+class Scenario(object):
+    """One scaled document and the profile its operations are created in"""
+
+    def __init__(self, api_version, size, owner):
+        self.swagger = scale_document(load_document(api_version), size)
+        self.body = json.dumps(self.swagger)
+        # Register the document like the swagger store does after fetching
+        # it, so request body templates are memoized as in production
+        swagger_store.remember(
+            '{}-{}'.format(api_version, size), self.swagger)
+        self.testconfig = TestConfiguration.objects.create(
+            name='benchmark {} {}'.format(api_version, size),
+            api_version=api_version,
+            owner=owner,
+            bank_id='gh.29.uk',
+            account_id='8ca8a7e4-6d02-40e3-a129-0b2bf89de9f0',
+            view_id='owner',
+            user_id='9ca9a7e4-6d02-40e3-a129-0b2bf89de9b1',
+        )
+        self.paths = list(self.swagger['paths'])
+        self.bodies = [
+            get_definition_name(operation)
+            for methods in self.swagger['paths'].values()
+            for method, operation in methods.items()
+            if method in ('post', 'put')
+        ]
+
+    def swagger_parsing(self, _):
+        build_index(json.loads(self.body))
+
+    def urlpath_expansion(self, _):
+        UrlpathExpander(self.testconfig).expand_all(self.paths)
+
+    def clear_templates(self):
+        with bodies.TEMPLATES_LOCK:
+            bodies.TEMPLATES.clear()
+
+    def body_generation(self, _):
+        for name in self.bodies:
+            bodies.get_request_body(self.swagger, name, self.testconfig)
+
+    def clear_profile(self):
+        ProfileOperation.objects.filter(profile=self.testconfig).delete()
+        self.clear_templates()
+
+    def profile_creation(self, _):
+        operations = get_profile_operations(self.swagger, self.testconfig)
+        profileOperation_bulk_insert(self.testconfig.pk, operations)
+
+    def index_rendering(self, client):
+        response = client.get(reverse('runtests-index-testconfig', kwargs={
+            'testconfig_pk': self.testconfig.pk,
+        }))
+        if response.status_code != 200:
+            raise AssertionError('Index returned {}'.format(response.status_code))
+
+    def get_client(self):
+        client = Client()
+        client.force_login(self.testconfig.owner)
+        # Render without asking the API for the current user
+        session = client.session
+        session[SESSION_KEY] = {
+            'user_id': None, 'username': 'benchmark', 'email': None,
+            'fetched': time.time(),
+        }
+        session.save()
+        return client
+
+    def run(self, benchmark, repeat):
+        if benchmark == 'body_generation':
+            return measure(self.body_generation, repeat, self.clear_templates)
+        if benchmark == 'profile_creation':
+            return measure(self.profile_creation, repeat, self.clear_profile)
+        if benchmark == 'index_rendering':
+            if not self.testconfig.operations.exists():
+                self.profile_creation(None)
+            return measure(self.index_rendering, repeat, self.get_client)
+        return measure(getattr(self, benchmark), repeat)
+
+
+def run_benchmarks(api_versions=None, sizes=None, benchmarks=None, repeat=5):
+    """
+    Runs the benchmarks on the scaled documents and returns the report
+    Expects a database it may write to.
+    """
+    api_versions = api_versions or API_VERSIONS
+    owner, _ = User.objects.get_or_create(username='benchmark')
+    results = []
+    for api_version in api_versions:
+        for size in sizes or SIZES:
+            scenario = Scenario(api_version, size, owner)
+            for benchmark in benchmarks or BENCHMARKS:
+                result = {
+                    'benchmark': benchmark,
+                    'api_version': api_version,
+                    'operations': size,
+                }
+                result.update(scenario.run(benchmark, repeat))
+                results.append(result)
+    return {
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'repeat': repeat,
+        'documents': describe_documents(api_versions),
+        'results': results,
+    }
+
+
+def find_regressions(baseline, report, tolerance=0.2):
+    """
+    Returns the results of report whose median is more than tolerance
+    slower than the same benchmark in baseline, with the baseline median
+    """
+    medians = {
+        (result['benchmark'], result['api_version'], result['operations']):
+            result['median']
+        for result in baseline['results']
+    }
+    regressions = []
+    for result in report['results']:
+        key = (result['benchmark'], result['api_version'], result['operations'])
+        if key in medians and result['median'] > medians[key] * (1 + tolerance):
+            regressions.append(dict(result, baseline=medians[key]))
+    return regressions
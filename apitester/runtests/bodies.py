@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Request body templates compiled from swagger definitions
+
+A definition is compiled once per swagger document into a template of its
+required fields, resolving nested and array $refs. Fields named like a
+TestConfiguration field are kept as variables and filled in from the
+profile when the template is rendered.
+"""
+
+from collections import OrderedDict
+import json
+import threading
+
+from obp.swagger import swagger_store
+
+from .models import TestConfiguration
+
+
+# Number of compiled definitions kept per process
+TEMPLATES_MAX_ENTRIES = 4096
+
+TEMPLATES = OrderedDict()
+TEMPLATES_LOCK = threading.Lock()
+
+
+class Variable(object):
+    """Placeholder for a profile field in a compiled template"""
+
+    def __init__(self, name):
+        self.name = name
+
+
+def get_profile_fields():
+    return frozenset(f.name for f in TestConfiguration._meta.fields)
+
+
+def compile_ref(definitions, ref, profile_fields, seen):
+    name = ref.rsplit('/', 1)[-1]
+    # Unknown or recursive definitions cannot be expanded
+    if name in seen or name not in definitions:
+        return None
+    return compile_object(definitions, definitions[name], profile_fields, seen | {name})
+
+
+def compile_property(definitions, field, prop, profile_fields, seen):
+    # Match Profile variables
+    if field in profile_fields:
+        return Variable(field)
+    if not isinstance(prop, dict):
+        return None
+    if '$ref' in prop:
+        return compile_ref(definitions, prop['$ref'], profile_fields, seen)
+    items = prop.get('items')
+    if prop.get('type') == 'array' and 'example' not in prop and\
+            isinstance(items, dict) and '$ref' in items:
+        return [compile_ref(definitions, items['$ref'], profile_fields, seen)]
+    return prop.get('example', '')
+
+
+def compile_object(definitions, definition, profile_fields, seen):
+    template = {}
+    properties = definition.get('properties') or {}
+    for field in definition.get('required') or []:
+        template[field] = compile_property(
+            definitions, field, properties.get(field), profile_fields, seen)
+    return template
+
+
+def compile_definition(swagger, name):
+    """
+    Compiles the named definition of given swagger document
+    Templates of documents loaded by the swagger store are memoized by
+    (content hash, definition name)
+    """
+    digest = swagger_store.get_digest(swagger)
+    key = (digest, name)
+    if digest is not None:
+        with TEMPLATES_LOCK:
+            if key in TEMPLATES:
+                TEMPLATES.move_to_end(key)
+                return TEMPLATES[key]
+    definitions = swagger.get('definitions') or {}
+    template = compile_ref(definitions, name, get_profile_fields(), frozenset())
+    if digest is not None:
+        with TEMPLATES_LOCK:
+            TEMPLATES[key] = template
+            while len(TEMPLATES) > TEMPLATES_MAX_ENTRIES:
+                TEMPLATES.popitem(last=False)
+    return template
+
+
+def render(template, testconfig):
+    """Fills the profile variables of given template in from testconfig"""
+    if isinstance(template, Variable):
+        return getattr(testconfig, template.name)
+    if isinstance(template, dict):
+        return {key: render(value, testconfig) for key, value in template.items()}
+    if isinstance(template, list):
+        return [render(value, testconfig) for value in template]
+    return template
+
+
+def get_request_body(swagger, name, testconfig):
+    """
+    Returns the JSON request body for the named definition as stored in a
+    profile operation, or '' if there is no such definition
+    """
+    if not name:
+        return ''
+    template = compile_definition(swagger, name)
+    if template is None:
+        return ''
+    return json.dumps(render(template, testconfig), indent=4)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Mergeable latency histograms
+
+Latencies in milliseconds are counted in log-linear buckets like in
+HdrHistogram: values below 2**SUB_BUCKET_BITS are exact, larger ones share
+a bucket with values that differ by less than 1 / 2**(SUB_BUCKET_BITS - 1),
+i.e. about 3%. Histograms of different runs or workers merge by adding
+their bucket counts, so percentiles never need the raw results.
+"""
+
+import json
+
+
+# Bits of precision per power of two
+SUB_BUCKET_BITS = 6
+SUB_BUCKET_COUNT = 2 ** SUB_BUCKET_BITS
+SUB_BUCKET_HALF = SUB_BUCKET_COUNT // 2
+
+
+def get_bucket(value):
+    """Returns the bucket index of given non-negative integer value"""
+    if value < SUB_BUCKET_COUNT:
+        return value
+    exponent = value.bit_length() - SUB_BUCKET_BITS
+    mantissa = value >> exponent
+    return SUB_BUCKET_COUNT + (exponent - 1) * SUB_BUCKET_HALF +\
+        mantissa - SUB_BUCKET_HALF
+
+
+def get_bucket_range(bucket):
+    """Returns the lowest and highest value counted in given bucket"""
+    if bucket < SUB_BUCKET_COUNT:
+        return bucket, bucket
+    exponent, offset = divmod(bucket - SUB_BUCKET_COUNT, SUB_BUCKET_HALF)
+    exponent += 1
+    mantissa = offset + SUB_BUCKET_HALF
+    return mantissa << exponent, ((mantissa + 1) << exponent) - 1
+
+
+class LatencyHistogram(object):
+    """Sparse log-bucketed histogram of latencies in milliseconds"""
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.max = 0
+
+    def record(self, value, count=1):
+        """Counts a latency, ignores negative ones which mark failed calls"""
+        value = int(value)
+        if value < 0:
+            return
+        bucket = get_bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += count
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Adds the counts of another histogram to this one"""
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, percentile):
+        """
+        Returns the latency below or at which given percentage of calls
+        finished, None for an empty histogram
+        """
+        if not self.count:
+            return None
+        rank = max(1, -(-self.count * percentile // 100))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(get_bucket_range(bucket)[1], self.max)
+        return self.max
+
+    def summary(self):
+        """Returns count, p50, p90, p99 and max, None for an empty histogram"""
+        if not self.count:
+            return None
+        return {
+            'count': self.count,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+    def dumps(self):
+        """Serializes the histogram into compact JSON"""
+        return json.dumps({
+            'counts': sorted(self.counts.items()),
+            'max': self.max,
+        }, separators=(',', ':'))
+
+    @classmethod
+    def loads(cls, data):
+        """Deserializes a histogram, an empty one for empty data"""
+        histogram = cls()
+        if not data:
+            return histogram
+        data = json.loads(data)
+        for bucket, count in data['counts']:
+            histogram.counts[bucket] = count
+            histogram.count += count
+        histogram.max = data['max']
+        return histogram
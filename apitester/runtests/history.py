@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Run history of runtests app
+
+Results are buffered and written with bulk inserts, so recording a run
+costs one query per RUN_HISTORY_BUFFER results instead of one per call.
+Latencies are also counted into histograms per run and per operation,
+which are merged into the stored ones when the run finishes.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from obp import metrics
+
+from .histogram import LatencyHistogram
+from .models import ProfileOperation, TestResult, TestRun
+
+
+def purge_history(now=None):
+    """
+    Deletes runs older than RUN_HISTORY_DAYS, together with their results
+    Keeps everything if RUN_HISTORY_DAYS is None.
+    """
+    if settings.RUN_HISTORY_DAYS is None:
+        return 0
+    cutoff = (now or timezone.now()) - timedelta(days=settings.RUN_HISTORY_DAYS)
+    deleted, _ = TestRun.objects.filter(started__lt=cutoff).delete()
+    return deleted
+
+
+class RunRecorder(object):
+    """Records one run of a profile and its results"""
+
+    def __init__(self, testconfig, concurrency=1):
+        self.run = TestRun.objects.create(
+            profile=testconfig,
+            api_host=settings.API_HOST,
+            api_version=testconfig.api_version or '',
+            started=timezone.now(),
+            concurrency=concurrency,
+        )
+        self.buffer = []
+        self.histogram = LatencyHistogram()
+        metrics.ACTIVE_RUNS.inc()
+        self.operation_histograms = {}
+
+    def make_result(self, result):
+        config = result['config']
+        timings = result.get('timings') or {}
+        return TestResult(
+            run=self.run,
+            profile_operation_id=config.get('id'),
+            operation_id=config.get('operation_id') or '',
+            method=config.get('method') or '',
+            urlpath=(config.get('urlpath') or '')[:255],
+            status_code=result.get('status_code'),
+            success=result['success'],
+            execution_time=result['execution_time'],
+            response_size=result.get('response_size', 0),
+            error='\n'.join(result['messages']),
+            dns_time=timings.get('dns'),
+            connect_time=timings.get('connect'),
+            tls_time=timings.get('tls'),
+            ttfb=timings.get('ttfb'),
+            transfer_time=timings.get('transfer'),
+            connection_reused=timings.get('reused'),
+        )
+
+    def add(self, result):
+        """Buffers the result of one test, as returned by runner.execute"""
+        record = self.make_result(result)
+        self.buffer.append(record)
+        # Fast error responses would skew the latencies
+        if record.success:
+            self.histogram.record(record.execution_time)
+            if record.profile_operation_id is not None:
+                self.operation_histograms.setdefault(
+                    record.profile_operation_id, LatencyHistogram(),
+                ).record(record.execution_time)
+        if len(self.buffer) >= settings.RUN_HISTORY_BUFFER:
+            self.flush()
+
+    def flush(self):
+        TestResult.objects.bulk_create(
+            self.buffer, batch_size=settings.DB_BATCH_SIZE)
+        self.buffer = []
+
+    def merge_operation_histograms(self):
+        """Merges the latencies of this run into those of the operations"""
+        with transaction.atomic():
+            operations = ProfileOperation.objects.select_for_update().filter(
+                id__in=list(self.operation_histograms.keys()))
+            operations = list(operations)
+            for operation in operations:
+                operation.latency = operation.latency_histogram.merge(
+                    self.operation_histograms[operation.id]).dumps()
+            ProfileOperation.objects.bulk_update(
+                operations, ['latency'], batch_size=settings.DB_BATCH_SIZE)
+
+    def finish(self):
+        """Writes what is still buffered and closes the run"""
+        metrics.ACTIVE_RUNS.dec()
+        self.flush()
+        self.merge_operation_histograms()
+        self.run.finished = timezone.now()
+        self.run.latency = self.histogram.dumps()
+        self.run.save(update_fields=['finished', 'latency'])
+        purge_history()
+        return self.run
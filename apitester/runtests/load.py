@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+Load tests of profile operations
+
+Closed loop: a fixed number of virtual users call one operation back to
+back, each one only sends its next request once the previous one has been
+answered. The test stops after a number of requests or a duration,
+whichever comes first.
+
+Open loop: requests are sent at a target arrival rate, constant, Poisson
+or in stages, independent of how fast the API answers.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+from queue import Empty, Queue
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from .histogram import LatencyHistogram
+from .runner import execute, get_concurrency
+
+
+# Supported arrival processes of open-loop tests
+ARRIVALS = ['constant', 'poisson']
+
+
+def get_limits(requests=None, duration=None):
+    """
+    Returns the number of requests and the duration in seconds to run for,
+    bounded by settings. Raises ValueError if neither is given.
+    """
+    requests = int(requests) if requests else None
+    duration = float(duration) if duration else None
+    if requests is None and duration is None:
+        raise ValueError('Either a number of requests or a duration is required')
+    if requests is not None:
+        requests = max(1, min(requests, settings.LOAD_MAX_REQUESTS))
+    if duration is not None:
+        duration = max(0.0, min(duration, settings.LOAD_MAX_DURATION))
+    else:
+        duration = settings.LOAD_MAX_DURATION
+    return requests, duration
+
+
+class LoadReport(object):
+    """Counts the outcome of a load test while it runs"""
+
+    def __init__(self, users):
+        self.users = users
+        self.requests = 0
+        self.errors = 0
+        self.status_codes = {}
+        self.histogram = LatencyHistogram()
+        self.started = time.monotonic()
+        self.finished = None
+
+    def add(self, result):
+        self.requests += 1
+        status_code = result.get('status_code')
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        if result['success']:
+            self.histogram.record(result['execution_time'])
+        else:
+            self.errors += 1
+
+    def finish(self):
+        self.finished = time.monotonic()
+
+    def as_dict(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            'users': self.users,
+            'requests': self.requests,
+            'errors': self.errors,
+            'error_rate': self.errors / self.requests if self.requests else 0,
+            'duration': round(elapsed, 3),
+            'throughput': round(self.requests / elapsed, 3) if elapsed else 0,
+            'status_codes': {str(code): count for code, count in self.status_codes.items()},
+            'latency': self.histogram.summary(),
+        }
+
+
+class ClosedLoop(object):
+    """Runs one config with a number of virtual users"""
+
+    def __init__(self, api, config, users=None, requests=None, duration=None):
+        self.api = api
+        self.config = config
+        self.users = get_concurrency(users)
+        self.requests, self.duration = get_limits(requests, duration)
+        self.lock = threading.Lock()
+        self.claimed = 0
+        self.results = Queue()
+
+    def claim(self, deadline):
+        """Returns whether a virtual user may send another request"""
+        if time.monotonic() >= deadline:
+            return False
+        with self.lock:
+            if self.requests is not None and self.claimed >= self.requests:
+                return False
+            self.claimed += 1
+            return True
+
+    def user(self, deadline):
+        try:
+            while self.claim(deadline):
+                self.results.put(execute(self.api, self.config))
+        finally:
+            # Tells the collector this user is done
+            self.results.put(None)
+
+    def run(self, recorder=None):
+        """
+        Runs the load test and returns its report
+        Every result is also handed to given RunRecorder, if any.
+        """
+        report = LoadReport(self.users)
+        deadline = time.monotonic() + self.duration
+        threads = [
+            threading.Thread(target=self.user, args=(deadline,))
+            for _ in range(self.users)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        running = len(threads)
+        # Results are collected here so only this thread touches the database
+        while running:
+            result = self.results.get()
+            if result is None:
+                running -= 1
+                continue
+            report.add(result)
+            if recorder is not None:
+                recorder.add(result)
+        report.finish()
+        return report.as_dict()
+
+
+def parse_stages(stages=None, rate=None, duration=None):
+    """
+    Returns the stages of an open-loop test as (duration, start rate, end
+    rate) tuples. stages is a list of [duration, target rate] pairs, the
+    rate changes linearly from the previous target, starting at 0, to the
+    stage's target, e.g. [[10, 50], [60, 50], [10, 0]] for a ramp-up, hold
+    and ramp-down. Without stages, rate is held constant for duration,
+    OPEN_LOOP_DEFAULT_DURATION if none is given.
+    Raises ValueError on invalid input.
+    """
+    if not stages:
+        if not rate:
+            raise ValueError('Either a rate or stages are required')
+        if float(rate) <= 0:
+            raise ValueError('Invalid rate {}'.format(rate))
+        stages = [[duration or settings.OPEN_LOOP_DEFAULT_DURATION, rate]]
+        previous = float(rate)
+    else:
+        previous = 0.0
+    parsed = []
+    total = 0.0
+    for stage_duration, target in stages:
+        stage_duration, target = float(stage_duration), float(target)
+        if stage_duration <= 0 or target < 0:
+            raise ValueError('Invalid stage [{}, {}]'.format(stage_duration, target))
+        stage_duration = min(stage_duration, settings.LOAD_MAX_DURATION - total)
+        if stage_duration <= 0:
+            break
+        parsed.append((stage_duration, previous, target))
+        total += stage_duration
+        previous = target
+    return parsed
+
+
+def get_arrival_time(stages, arrivals):
+    """
+    Returns the offset in seconds at which the cumulative number of arrivals
+    of given stages reaches given value, None if it never does
+    """
+    offset = 0.0
+    for duration, start, end in stages:
+        slope = (end - start) / duration
+        expected = (start + end) / 2 * duration
+        if expected == 0:
+            # Idle stage
+            offset += duration
+            continue
+        if arrivals <= expected:
+            # Solves start * t + slope * t**2 / 2 = arrivals for t
+            if slope == 0:
+                return offset + arrivals / start
+            root = max(0.0, start ** 2 + 2 * slope * arrivals) ** 0.5
+            return offset + (root - start) / slope
+        arrivals -= expected
+        offset += duration
+    return None
+
+
+def iter_schedule(stages, arrival='constant', seed=None):
+    """
+    Yields the intended send offsets in seconds
+    Constant arrivals are evenly spaced, Poisson arrivals have exponentially
+    distributed gaps with the same mean rate.
+    """
+    rng = random.Random(seed)
+    end = sum(duration for duration, _, _ in stages)
+    arrivals = 0.0
+    for count in itertools.count():
+        if arrival == 'poisson':
+            arrivals += rng.expovariate(1.0)
+        else:
+            arrivals = count
+        offset = get_arrival_time(stages, arrivals)
+        if offset is None or offset >= end:
+            return
+        yield offset
+
+
+class OpenLoop(object):
+    """
+    Sends the configs of a plan round-robin at a target arrival rate
+
+    Requests are started at their intended time whether earlier ones have
+    been answered or not. If no worker is free in time, a request starts
+    late: the lag is reported and added to its response time, so slow
+    responses cannot hide behind a slowed-down schedule (coordinated
+    omission).
+
+    Results are aggregated as they come in and their response bodies are
+    dropped, the intended and actual send time of every request is only
+    kept if asked for with timeline.
+    """
+
+    def __init__(self, api, plan, stages, arrival='constant', seed=None,
+                 timeline=False):
+        if arrival not in ARRIVALS:
+            raise ValueError('Unknown arrival {}'.format(arrival))
+        if not plan:
+            raise ValueError('Nothing to run')
+        self.api = api
+        self.plan = plan
+        self.stages = stages
+        self.arrival = arrival
+        self.seed = seed
+        self.timeline = [] if timeline else None
+        self.results = Queue()
+
+    def send(self, config, start, intended):
+        sent = time.monotonic() - start
+        try:
+            result = execute(self.api, config)
+        except Exception as err:
+            # Raised again by the collector
+            self.results.put(err)
+            return
+        # Bodies of thousands of responses would pile up in memory
+        result.pop('text', None)
+        result.update({
+            'intended': round(intended, 6),
+            'sent': round(sent, 6),
+        })
+        self.results.put(result)
+
+    def collect(self, report, lags, response_times, recorder, timeout=None):
+        """
+        Adds the next result to the report, waits up to timeout seconds
+        for one. Returns whether there was one.
+        """
+        try:
+            result = self.results.get(timeout=timeout)
+        except Empty:
+            return False
+        if isinstance(result, Exception):
+            raise result
+        lag = max(0, int((result['sent'] - result['intended']) * 1000))
+        lags.record(lag)
+        report.add(result)
+        if result['success']:
+            response_times.record(lag + result['execution_time'])
+        if self.timeline is not None:
+            self.timeline.append([
+                result['intended'], result['sent'], result['execution_time']])
+        if recorder is not None:
+            recorder.add(result)
+        return True
+
+    def run(self, recorder=None):
+        """
+        Runs the schedule and returns its report
+        Every result is also handed to given RunRecorder, if any.
+        """
+        report = LoadReport(settings.OPEN_LOOP_MAX_WORKERS)
+        lags = LatencyHistogram()
+        response_times = LatencyHistogram()
+        configs = itertools.cycle(self.plan)
+        schedule = itertools.islice(
+            iter_schedule(self.stages, self.arrival, self.seed),
+            settings.LOAD_MAX_REQUESTS)
+        executor = ThreadPoolExecutor(max_workers=settings.OPEN_LOOP_MAX_WORKERS)
+        sent = 0
+        collected = 0
+        start = time.monotonic()
+        try:
+            for intended in schedule:
+                # Results are collected here while waiting to send, so only
+                # this thread touches the database
+                while True:
+                    delay = intended - (time.monotonic() - start)
+                    if delay <= 0 or not self.collect(
+                            report, lags, response_times, recorder, delay):
+                        break
+                    collected += 1
+                executor.submit(self.send, next(configs), start, intended)
+                sent += 1
+            while collected < sent:
+                self.collect(report, lags, response_times, recorder)
+                collected += 1
+        finally:
+            executor.shutdown(wait=True)
+        report.finish()
+        report = report.as_dict()
+        report['workers'] = report.pop('users')
+        intended = sum(
+            (start_rate + end_rate) / 2 * duration
+            for duration, start_rate, end_rate in self.stages)
+        report.update({
+            'arrival': self.arrival,
+            'stages': self.stages,
+            'intended_requests': int(intended),
+            'lag': lags.summary(),
+            'response_time': response_times.summary(),
+        })
+        if self.timeline is not None:
+            report['timeline'] = self.timeline
+        return report
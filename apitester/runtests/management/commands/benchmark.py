@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the offline micro-benchmarks of the tester and reports them as JSON
+
+Exits with status 1 if a baseline report is given and a benchmark got
+slower than the tolerance allows.
+"""
+
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from obp.api import API, APIError
+from runtests.benchmark import (
+    API_VERSIONS, BENCHMARKS, SIZES, find_regressions, record_document,
+    run_benchmarks)
+
+
+def get_list(value, choices=None, cast=str):
+    """Splits a comma-separated option, checking its items against choices"""
+    items = [cast(item.strip()) for item in value.split(',') if item.strip()]
+    for item in items:
+        if choices is not None and item not in choices:
+            raise CommandError('Unknown {}, choose from {}'.format(
+                item, ', '.join(str(choice) for choice in choices)))
+    return items
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks swagger parsing, body generation and profile pages offline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--api-versions', default=','.join(API_VERSIONS),
+            help='Comma-separated API versions of the resource docs to use')
+        parser.add_argument(
+            '--sizes', default=','.join(str(size) for size in SIZES),
+            help='Comma-separated numbers of operations to scale the docs to')
+        parser.add_argument(
+            '--benchmarks', default=','.join(BENCHMARKS),
+            help='Comma-separated benchmarks to run')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Number of times every benchmark is timed')
+        parser.add_argument(
+            '--output', default='-',
+            help='Path to write the JSON report to, - for stdout')
+        parser.add_argument(
+            '--baseline',
+            help='Path of an earlier JSON report to compare the results with')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Share a median may exceed its baseline by, defaults to 0.2')
+        parser.add_argument(
+            '--record', action='store_true',
+            help='Replace the checked-in resource docs by the ones of API_HOST')
+
+    def record(self, api_versions):
+        api = API()
+        for api_version in api_versions:
+            try:
+                record_document(api, api_version)
+            except (APIError, ValueError) as err:
+                raise CommandError(err)
+            self.stderr.write('Recorded {}\n'.format(api_version))
+
+    def run(self, options):
+        """Runs the benchmarks in a throwaway test database"""
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            return run_benchmarks(
+                get_list(options['api_versions'], API_VERSIONS),
+                get_list(options['sizes'], cast=int),
+                get_list(options['benchmarks'], BENCHMARKS),
+                max(1, options['repeat']))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def handle(self, *args, **options):
+        if options['record']:
+            self.record(get_list(options['api_versions'], API_VERSIONS))
+            return
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+
+        report = self.run(options)
+        output = json.dumps(report, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(output)
+        else:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+
+        if baseline is not None:
+            regressions = find_regressions(baseline, report, options['tolerance'])
+            for result in regressions:
+                self.stderr.write('{benchmark} {api_version} {operations}: '
+                                  '{median} ms, was {baseline} ms\n'.format(**result))
+            if regressions:
+                sys.exit(1)
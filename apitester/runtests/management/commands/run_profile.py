@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Runs a test profile without a browser, e.g. as a nightly performance gate
+
+Exits with status 1 if any call failed or returned an unexpected status code.
+"""
+
+import json
+import os
+import sys
+from xml.etree import ElementTree
+
+from django.core.management.base import BaseCommand, CommandError
+
+from obp.api import API
+from obp.authenticator import AuthenticatorError
+from obp.directlogin import DirectLoginAuthenticator
+from runtests.histogram import LatencyHistogram
+from runtests.history import RunRecorder
+from runtests.models import TestConfiguration
+from runtests.runner import (
+    check_plan, get_concurrency, get_swagger_index, iter_plan, make_config)
+
+
+class Command(BaseCommand):
+    help = 'Runs the operations of a test profile concurrently'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'profile', help='Name or id of the TestConfiguration to run')
+        parser.add_argument(
+            '--directlogin-token',
+            default=os.environ.get('OBP_DIRECTLOGIN_TOKEN'),
+            help='DirectLogin token, defaults to $OBP_DIRECTLOGIN_TOKEN')
+        parser.add_argument(
+            '--gatewaylogin-token',
+            default=os.environ.get('OBP_GATEWAYLOGIN_TOKEN'),
+            help='GatewayLogin token, defaults to $OBP_GATEWAYLOGIN_TOKEN')
+        parser.add_argument(
+            '--username', help='Username to get a DirectLogin token with')
+        parser.add_argument(
+            '--password', default=os.environ.get('OBP_PASSWORD'),
+            help='Password to get a DirectLogin token with, defaults to $OBP_PASSWORD')
+        parser.add_argument(
+            '--consumer-key', help='Consumer key to get a DirectLogin token with')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of calls in flight, defaults to RUN_CONCURRENCY')
+        parser.add_argument(
+            '--repeat', type=int, default=1,
+            help='Number of times every operation is run')
+        parser.add_argument(
+            '--junit', help='Path to write a JUnit XML report to')
+        parser.add_argument(
+            '--ndjson',
+            help='Path to write one JSON result per line to, - for stdout')
+        parser.add_argument(
+            '--no-history', action='store_true',
+            help='Do not record the run in the run history')
+
+    def get_testconfig(self, profile):
+        lookup = {'pk': int(profile)} if profile.isdigit() else {'name': profile}
+        try:
+            return TestConfiguration.objects.get(**lookup)
+        except TestConfiguration.DoesNotExist:
+            raise CommandError('Unknown profile {}'.format(profile))
+
+    def get_session_data(self, options):
+        """Returns the session data of the requested authenticator"""
+        if options['username']:
+            authenticator = DirectLoginAuthenticator()
+            try:
+                authenticator.login_to_api({
+                    'username': options['username'],
+                    'password': options['password'],
+                    'consumer_key': options['consumer_key'],
+                })
+            except AuthenticatorError as err:
+                raise CommandError('DirectLogin failed: {}'.format(err))
+            options['directlogin_token'] = authenticator.token
+        if options['directlogin_token']:
+            return {
+                'authenticator': 'obp.directlogin.DirectLoginAuthenticator',
+                'authenticator_kwargs': {'token': options['directlogin_token']},
+            }
+        if options['gatewaylogin_token']:
+            return {
+                'authenticator': 'obp.gatewaylogin.GatewayLoginAuthenticator',
+                'authenticator_kwargs': {'token': options['gatewaylogin_token']},
+            }
+        raise CommandError(
+            'Credentials are required: a DirectLogin or GatewayLogin token, '
+            'or username, password and consumer key')
+
+    def get_plan(self, api, testconfig, repeat):
+        operations = testconfig.operations.filter(
+            is_deleted=0).order_by('order', 'id')
+        expander = testconfig.urlpath_expander
+        index = get_swagger_index(api, testconfig)
+        plan = [
+            make_config(
+                testconfig, operation, expander.expand(operation.urlpath),
+                index=index)
+            for operation in operations
+        ]
+        return plan * max(1, repeat)
+
+    def write_junit(self, path, testconfig, results):
+        failures = [r for r in results if not r['success'] and r.get('status_code')]
+        errors = [r for r in results if not r.get('status_code')]
+        suite = ElementTree.Element('testsuite', {
+            'name': testconfig.name,
+            'tests': str(len(results)),
+            'failures': str(len(failures)),
+            'errors': str(len(errors)),
+            'time': '{:.3f}'.format(
+                sum(max(0, r['execution_time']) for r in results) / 1000),
+        })
+        for result in results:
+            config = result['config']
+            case = ElementTree.SubElement(suite, 'testcase', {
+                'classname': testconfig.name,
+                'name': '{} {} {}'.format(
+                    config['operation_id'], config['method'].upper(), config['urlpath']),
+                'time': '{:.3f}'.format(max(0, result['execution_time']) / 1000),
+            })
+            if not result['success']:
+                tag = 'failure' if result.get('status_code') else 'error'
+                message = ' '.join(result['messages'])
+                element = ElementTree.SubElement(case, tag, {'message': message})
+                element.text = result['text'] or message
+        ElementTree.ElementTree(suite).write(
+            path, encoding='utf-8', xml_declaration=True)
+
+    def write_summary(self, results, stream):
+        histograms = {}
+        total = LatencyHistogram()
+        for result in results:
+            if result['success']:
+                operation_id = result['config']['operation_id']
+                histograms.setdefault(operation_id, LatencyHistogram()).record(
+                    result['execution_time'])
+                total.record(result['execution_time'])
+        line = '{:<60} {:>6} {:>7} {:>7} {:>7} {:>7}\n'
+        stream.write(line.format('operation', 'calls', 'p50', 'p90', 'p99', 'max'))
+        rows = sorted(histograms.items()) + [('total', total)]
+        for operation_id, histogram in rows:
+            summary = histogram.summary()
+            if summary is None:
+                continue
+            stream.write(line.format(
+                operation_id, summary['count'], summary['p50'],
+                summary['p90'], summary['p99'], summary['max']))
+        failed = len([r for r in results if not r['success']])
+        stream.write('{} of {} calls failed\n'.format(failed, len(results)))
+
+    def handle(self, *args, **options):
+        testconfig = self.get_testconfig(options['profile'])
+        api = API(self.get_session_data(options))
+        plan = self.get_plan(api, testconfig, options['repeat'])
+        try:
+            check_plan(plan)
+        except ValueError as err:
+            raise CommandError(err)
+        concurrency = get_concurrency(options['workers'])
+        recorder = None
+        if not options['no_history']:
+            recorder = RunRecorder(testconfig, concurrency)
+
+        ndjson = None
+        if options['ndjson'] == '-':
+            ndjson = self.stdout
+        elif options['ndjson']:
+            ndjson = open(options['ndjson'], 'w')
+        results = []
+        try:
+            for result in iter_plan(api, plan, concurrency):
+                results.append(result)
+                if recorder is not None:
+                    recorder.add(result)
+                if ndjson is not None:
+                    ndjson.write(json.dumps(result) + '\n')
+        finally:
+            if recorder is not None:
+                recorder.finish()
+            if ndjson is not None and ndjson is not self.stdout:
+                ndjson.close()
+
+        if options['junit']:
+            self.write_junit(options['junit'], testconfig, results)
+        # Keep stdout parseable when it carries NDJSON
+        summary = self.stderr if ndjson is self.stdout else self.stdout
+        self.write_summary(results, summary)
+        if not all(result['success'] for result in results):
+            sys.exit(1)
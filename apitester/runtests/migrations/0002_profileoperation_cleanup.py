@@ -0,0 +1,45 @@
+# Prepares ProfileOperation rows for the constraints added in 0003
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def cleanup_profile_operations(apps, schema_editor):
+    ProfileOperation = apps.get_model('runtests', 'ProfileOperation')
+    TestConfiguration = apps.get_model('runtests', 'TestConfiguration')
+
+    # Operations of deleted profiles would violate the new foreign key
+    profile_ids = TestConfiguration.objects.values_list('id', flat=True)
+    ProfileOperation.objects.exclude(profile_id__in=profile_ids).delete()
+
+    # Keep only the most recent row per (profile, operation, replica),
+    # deleting only in groups which have more than one
+    duplicates = ProfileOperation.objects.values(
+        'profile_id', 'operation_id', 'replica_id',
+    ).annotate(last_id=Max('id'), n=Count('id')).filter(n__gt=1).order_by()
+    for duplicate in duplicates:
+        ProfileOperation.objects.filter(
+            profile_id=duplicate['profile_id'],
+            operation_id=duplicate['operation_id'],
+            replica_id=duplicate['replica_id'],
+        ).exclude(id=duplicate['last_id']).delete()
+
+    # save_time becomes an integer
+    for operation in ProfileOperation.objects.only('id', 'save_time'):
+        value = (operation.save_time or '').strip()
+        if not value.isdigit():
+            value = '0'
+        if value != operation.save_time:
+            operation.save_time = value
+            operation.save(update_fields=['save_time'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(cleanup_profile_operations, migrations.RunPython.noop),
+    ]
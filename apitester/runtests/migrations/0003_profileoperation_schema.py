@@ -0,0 +1,52 @@
+# Turns ProfileOperation.profile_id into a foreign key, save_time into an
+# integer and adds the indexes used by the runtests views
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0002_profileoperation_cleanup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testconfiguration',
+            name='name',
+            field=models.CharField(help_text='Name of the configuration', max_length=255, unique=True, verbose_name='Profile Name'),
+        ),
+        migrations.AlterField(
+            model_name='testconfiguration',
+            name='username',
+            field=models.CharField(blank=True, help_text='Username', max_length=255, null=True, verbose_name='User Name'),
+        ),
+        migrations.AlterField(
+            model_name='profileoperation',
+            name='save_time',
+            field=models.IntegerField(default=0, help_text='Unix timestamp of the last save', verbose_name='save_time'),
+        ),
+        migrations.RenameField(
+            model_name='profileoperation',
+            old_name='profile_id',
+            new_name='profile',
+        ),
+        migrations.AlterField(
+            model_name='profileoperation',
+            name='profile',
+            field=models.ForeignKey(db_column='profile_id', db_index=False, help_text='Test Profile id', on_delete=django.db.models.deletion.CASCADE, related_name='operations', to='runtests.TestConfiguration', verbose_name='Profile id'),
+        ),
+        migrations.AddConstraint(
+            model_name='profileoperation',
+            constraint=models.UniqueConstraint(fields=('profile', 'operation_id', 'replica_id'), name='runtests_po_unique_replica'),
+        ),
+        migrations.AddIndex(
+            model_name='profileoperation',
+            index=models.Index(fields=['profile', 'is_deleted', '-save_time'], name='runtests_po_listing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profileoperation',
+            index=models.Index(fields=['profile', 'operation_id', 'is_deleted'], name='runtests_po_operation_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0003_profileoperation_schema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('api_host', models.CharField(help_text='Host the run was made against', max_length=255, verbose_name='API host')),
+                ('api_version', models.CharField(blank=True, help_text='API version of the profile at the time of the run', max_length=255, verbose_name='API version')),
+                ('started', models.DateTimeField(db_index=True, help_text='Time the run started', verbose_name='Started')),
+                ('finished', models.DateTimeField(blank=True, help_text='Time the run finished', null=True, verbose_name='Finished')),
+                ('concurrency', models.IntegerField(default=1, help_text='Number of calls in flight at a time', verbose_name='Concurrency')),
+                ('profile', models.ForeignKey(help_text='Test profile which was run', on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='runtests.TestConfiguration', verbose_name='Profile')),
+            ],
+            options={
+                'verbose_name': 'Test Run',
+                'verbose_name_plural': 'Test Runs',
+            },
+        ),
+        migrations.CreateModel(
+            name='TestResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation_id', models.CharField(blank=True, max_length=255, verbose_name='Operation id')),
+                ('method', models.CharField(blank=True, max_length=255, verbose_name='Method')),
+                ('urlpath', models.CharField(blank=True, max_length=255, verbose_name='URL path')),
+                ('status_code', models.IntegerField(blank=True, help_text='Status code returned by the API, if any', null=True, verbose_name='Status code')),
+                ('success', models.BooleanField(default=False, verbose_name='Success')),
+                ('execution_time', models.IntegerField(default=-1, help_text='Latency of the call in milliseconds, -1 if it failed', verbose_name='Execution time')),
+                ('response_size', models.IntegerField(default=0, help_text='Size of the response body in bytes', verbose_name='Response size')),
+                ('error', models.TextField(blank=True, help_text='Why the test failed', verbose_name='Error')),
+                ('profile_operation', models.ForeignKey(blank=True, help_text='Operation which was called, if it still exists', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='results', to='runtests.ProfileOperation', verbose_name='Profile operation')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='runtests.TestRun', verbose_name='Run')),
+            ],
+            options={
+                'verbose_name': 'Test Result',
+                'verbose_name_plural': 'Test Results',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='testrun',
+            index=models.Index(fields=['profile', '-started'], name='runtests_run_profile_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testresult',
+            index=models.Index(fields=['operation_id', 'run'], name='runtests_result_op_idx'),
+        ),
+    ]
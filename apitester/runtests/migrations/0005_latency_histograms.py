@@ -0,0 +1,23 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0004_testrun_testresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profileoperation',
+            name='latency',
+            field=models.TextField(blank=True, default='', help_text='Serialized latency histogram of all recorded runs', verbose_name='Latency'),
+        ),
+        migrations.AddField(
+            model_name='testrun',
+            name='latency',
+            field=models.TextField(blank=True, default='', help_text='Serialized latency histogram of the run', verbose_name='Latency'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0005_latency_histograms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profileoperation',
+            name='depends_on',
+            field=models.CharField(blank=True, default='', help_text='Comma-separated operation ids of the same order which have to finish first', max_length=1024, verbose_name='Depends on'),
+        ),
+    ]
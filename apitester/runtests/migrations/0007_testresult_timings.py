@@ -0,0 +1,43 @@
+# Generated by Django 2.2.13 on 2026-10-18 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('runtests', '0006_profileoperation_depends_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testresult',
+            name='connect_time',
+            field=models.FloatField(blank=True, help_text='TCP connect in milliseconds, 0 on reused connections', null=True, verbose_name='Connect time'),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='connection_reused',
+            field=models.BooleanField(blank=True, null=True, verbose_name='Connection reused'),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='dns_time',
+            field=models.FloatField(blank=True, help_text='Name resolution in milliseconds, 0 on reused connections', null=True, verbose_name='DNS time'),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='tls_time',
+            field=models.FloatField(blank=True, help_text='TLS handshake in milliseconds, 0 on reused connections', null=True, verbose_name='TLS time'),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='transfer_time',
+            field=models.FloatField(blank=True, help_text='Receiving the response body in milliseconds', null=True, verbose_name='Transfer time'),
+        ),
+        migrations.AddField(
+            model_name='testresult',
+            name='ttfb',
+            field=models.FloatField(blank=True, help_text='Sending the request and waiting for the response headers in milliseconds', null=True, verbose_name='Time to first byte'),
+        ),
+    ]
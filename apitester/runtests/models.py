@@ -5,6 +5,10 @@ Models of runtests app
 
 from django.db import models
 from django.conf import settings
+from django.utils.functional import cached_property
+
+from .histogram import LatencyHistogram
+from .urlpaths import UrlpathExpander
 
 
 class TestConfiguration(models.Model):
@@ -168,11 +172,27 @@ class TestConfiguration(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Placeholder values may have changed
+        self.__dict__.pop('urlpath_expander', None)
+        return super(TestConfiguration, self).save(*args, **kwargs)
+
+    @cached_property
+    def urlpath_expander(self):
+        """Expands URL path placeholders with the values of this profile"""
+        return UrlpathExpander(self)
+
 
 class ProfileOperation(models.Model):
-    profile_id = models.IntegerField(
+    profile = models.ForeignKey(
+        TestConfiguration,
         verbose_name="Profile id",
-        help_text="Test Profile id"
+        help_text="Test Profile id",
+        related_name='operations',
+        db_column='profile_id',
+        # Covered by the unique constraint below
+        db_index=False,
+        on_delete=models.CASCADE,
     )
     operation_id = models.CharField(
         max_length=255,
@@ -229,16 +249,214 @@ class ProfileOperation(models.Model):
         null=False
     )
 
-    save_time = models.CharField(
-        max_length=255,
+    save_time = models.IntegerField(
         verbose_name="save_time",
-        help_text="save_time",
-        blank=True,
+        help_text="Unix timestamp of the last save",
+        default=0,
         null=False
     )
+    depends_on = models.CharField(
+        max_length=1024,
+        verbose_name="Depends on",
+        help_text="Comma-separated operation ids of the same order which have to finish first",
+        blank=True,
+        default='',
+    )
+    latency = models.TextField(
+        verbose_name="Latency",
+        help_text="Serialized latency histogram of all recorded runs",
+        blank=True,
+        default='',
+    )
     class Meta:
         verbose_name = 'Test Profile Operation'
         verbose_name_plural = 'Test Profile Operation'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['profile', 'operation_id', 'replica_id'],
+                name='runtests_po_unique_replica',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['profile', 'is_deleted', '-save_time'],
+                name='runtests_po_listing_idx',
+            ),
+            models.Index(
+                fields=['profile', 'operation_id', 'is_deleted'],
+                name='runtests_po_operation_idx',
+            ),
+        ]
+
+    @property
+    def latency_histogram(self):
+        return LatencyHistogram.loads(self.latency)
 
     def __str__(self):
         return "profile_id:\t{}\noperationid:\t{}\n".format(self.profile_id,self.operation_id)
+
+
+class TestRun(models.Model):
+    profile = models.ForeignKey(
+        TestConfiguration,
+        verbose_name='Profile',
+        help_text='Test profile which was run',
+        related_name='runs',
+        on_delete=models.CASCADE,
+    )
+    api_host = models.CharField(
+        max_length=255,
+        verbose_name='API host',
+        help_text='Host the run was made against',
+    )
+    api_version = models.CharField(
+        max_length=255,
+        verbose_name='API version',
+        help_text='API version of the profile at the time of the run',
+        blank=True,
+    )
+    started = models.DateTimeField(
+        verbose_name='Started',
+        help_text='Time the run started',
+        db_index=True,
+    )
+    finished = models.DateTimeField(
+        verbose_name='Finished',
+        help_text='Time the run finished',
+        blank=True,
+        null=True,
+    )
+    concurrency = models.IntegerField(
+        verbose_name='Concurrency',
+        help_text='Number of calls in flight at a time',
+        default=1,
+    )
+    latency = models.TextField(
+        verbose_name='Latency',
+        help_text='Serialized latency histogram of the run',
+        blank=True,
+        default='',
+    )
+
+    class Meta:
+        verbose_name = 'Test Run'
+        verbose_name_plural = 'Test Runs'
+        indexes = [
+            models.Index(
+                fields=['profile', '-started'],
+                name='runtests_run_profile_idx',
+            ),
+        ]
+
+    @property
+    def latency_histogram(self):
+        return LatencyHistogram.loads(self.latency)
+
+    def __str__(self):
+        return '{} at {}'.format(self.profile_id, self.started)
+
+
+class TestResult(models.Model):
+    run = models.ForeignKey(
+        TestRun,
+        verbose_name='Run',
+        related_name='results',
+        on_delete=models.CASCADE,
+    )
+    profile_operation = models.ForeignKey(
+        ProfileOperation,
+        verbose_name='Profile operation',
+        help_text='Operation which was called, if it still exists',
+        related_name='results',
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+    )
+    operation_id = models.CharField(
+        max_length=255,
+        verbose_name='Operation id',
+        blank=True,
+    )
+    method = models.CharField(
+        max_length=255,
+        verbose_name='Method',
+        blank=True,
+    )
+    urlpath = models.CharField(
+        max_length=255,
+        verbose_name='URL path',
+        blank=True,
+    )
+    status_code = models.IntegerField(
+        verbose_name='Status code',
+        help_text='Status code returned by the API, if any',
+        blank=True,
+        null=True,
+    )
+    success = models.BooleanField(
+        verbose_name='Success',
+        default=False,
+    )
+    execution_time = models.IntegerField(
+        verbose_name='Execution time',
+        help_text='Latency of the call in milliseconds, -1 if it failed',
+        default=-1,
+    )
+    response_size = models.IntegerField(
+        verbose_name='Response size',
+        help_text='Size of the response body in bytes',
+        default=0,
+    )
+    dns_time = models.FloatField(
+        verbose_name='DNS time',
+        help_text='Name resolution in milliseconds, 0 on reused connections',
+        blank=True,
+        null=True,
+    )
+    connect_time = models.FloatField(
+        verbose_name='Connect time',
+        help_text='TCP connect in milliseconds, 0 on reused connections',
+        blank=True,
+        null=True,
+    )
+    tls_time = models.FloatField(
+        verbose_name='TLS time',
+        help_text='TLS handshake in milliseconds, 0 on reused connections',
+        blank=True,
+        null=True,
+    )
+    ttfb = models.FloatField(
+        verbose_name='Time to first byte',
+        help_text='Sending the request and waiting for the response headers in milliseconds',
+        blank=True,
+        null=True,
+    )
+    transfer_time = models.FloatField(
+        verbose_name='Transfer time',
+        help_text='Receiving the response body in milliseconds',
+        blank=True,
+        null=True,
+    )
+    connection_reused = models.BooleanField(
+        verbose_name='Connection reused',
+        blank=True,
+        null=True,
+    )
+    error = models.TextField(
+        verbose_name='Error',
+        help_text='Why the test failed',
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = 'Test Result'
+        verbose_name_plural = 'Test Results'
+        indexes = [
+            models.Index(
+                fields=['operation_id', 'run'],
+                name='runtests_result_op_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return '{} {}: {}'.format(self.run_id, self.operation_id, self.status_code)
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Server-side execution of profile operations
+
+Shared by the single-test RunView and the batch endpoints, so a whole
+profile can be run without one browser request per operation.
+
+Operations with the same `order` form a stage. Stages run one after the
+other, the operations of a stage run concurrently. Within a stage an
+operation additionally waits for the operations listed in its `depends_on`
+and is skipped if one of them failed.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
+import logging
+
+from django.conf import settings
+
+from obp.api import APIError
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+def expected_status_code(method, status_codes=None):
+    """
+    Returns the status code a successful call with given method returns
+    status_codes are the success codes the resource docs declare for the
+    operation, the method's usual code is only used if it is one of them or
+    none are declared.
+    """
+    if method == 'post':
+        status_code = 201
+    elif method == 'delete':
+        status_code = 204
+    else:
+        status_code = 200
+    if status_codes and status_code not in status_codes:
+        return status_codes[0]
+    return status_code
+
+
+def get_swagger_index(api, testconfig):
+    """
+    Returns the swagger index of the API version of given profile, empty if
+    it cannot be fetched, so expected status codes follow the method
+    """
+    try:
+        return api.get_swagger_index(testconfig.api_version)
+    except APIError as err:
+        LOGGER.log(logging.WARNING, 'No swagger index of {}: {}'.format(
+            testconfig.api_version, err))
+        return {}
+
+
+def get_status_codes(index, operation):
+    """Returns the success status codes indexed for given profile operation"""
+    entry = (index or {}).get(operation.operation_id)
+    if entry is None or entry['method'] != operation.method:
+        return None
+    return entry['status_codes']
+
+
+def get_concurrency(value=None):
+    """Returns the requested concurrency, bounded by settings"""
+    try:
+        concurrency = int(value)
+    except (TypeError, ValueError):
+        concurrency = settings.RUN_CONCURRENCY
+    return max(1, min(concurrency, settings.RUN_MAX_CONCURRENCY))
+
+
+def get_dependencies(value):
+    """Returns the operation ids of a comma-separated depends_on value"""
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def make_config(testconfig, operation, urlpath, payload=None, index=None):
+    """
+    Builds the run config for a stored profile operation
+    payload overrides the stored JSON body, e.g. with unsaved edits, index
+    is the swagger index to take the expected status code from
+    """
+    return {
+        'found': True,
+        'id': operation.id,
+        'method': operation.method,
+        'status_code': expected_status_code(
+            operation.method, get_status_codes(index, operation)),
+        'summary': operation.remark or operation.operation_id,
+        'urlpath': urlpath,
+        'operation_id': operation.operation_id,
+        'api_version': testconfig.api_version,
+        'replica_id': operation.replica_id,
+        'profile_id': testconfig.pk,
+        'payload': operation.json_body if payload is None else payload,
+        'order': operation.order,
+        'depends_on': get_dependencies(operation.depends_on),
+    }
+
+
+def run_test(api, config):
+    """Runs a test with given config"""
+    url = '{}{}'.format(settings.API_HOST, config['urlpath'])
+    payload = None
+    if config['method'] != 'get' and config['method'] != 'delete':
+        try:
+            payload = json.loads(config['payload'])
+        except (TypeError, ValueError):
+            payload = None
+    # Let APIError bubble up
+    response = api.call(
+        config['method'], url, payload, operation_id=config.get('operation_id'),
+        api_version=config.get('api_version'))
+    try:
+        text = response.json()
+    except ValueError:
+        text = response.text
+    text = json.dumps(
+        text, sort_keys=True, indent=2, separators=(',', ': '))
+    result = {
+        'text': text,
+        'execution_time': response.execution_time,
+        'status_code': response.status_code,
+        'response_size': len(response.content),
+        'timings': response.timings,
+    }
+    return result
+
+
+def execute(api, config):
+    """
+    Runs a test and checks its status code
+    Returns the JSON-serialisable result as sent to the browser
+    """
+    result = {
+        'config': config,
+        'text': None,
+        'execution_time': -1,
+        'messages': [],
+        'success': False,
+    }
+    if not config['found']:
+        msg = 'Unknown path {}!'.format(config['urlpath'])
+        result['messages'].append(msg)
+        return result
+
+    try:
+        result.update(run_test(api, config))
+    except APIError as err:
+        result['messages'].append(str(err))
+        return result
+
+    # Test if status code is as expected
+    if result['status_code'] != config['status_code']:
+        msg = 'Status code is {}, but expected {}!'.format(
+            result['status_code'], config['status_code'])
+        result['messages'].append(msg)
+        return result
+
+    result['success'] = True
+    return result
+
+
+def get_stages(plan):
+    """Returns the plan indexes of every stage, ordered by `order`"""
+    stages = {}
+    for index, config in enumerate(plan):
+        stages.setdefault(config.get('order', 0), []).append(index)
+    return [stages[order] for order in sorted(stages)]
+
+
+def get_prerequisites(plan, stage):
+    """
+    Returns for every plan index of given stage the indexes of the same
+    stage it depends on. Dependencies on other stages are covered by the
+    stage order or ignored. Raises ValueError on circular dependencies.
+    """
+    by_operation = {}
+    for index in stage:
+        by_operation.setdefault(plan[index].get('operation_id'), []).append(index)
+    prerequisites = {}
+    for index in stage:
+        prerequisites[index] = set(
+            other
+            for operation_id in plan[index].get('depends_on', [])
+            for other in by_operation.get(operation_id, [])
+            if other != index
+        )
+
+    # Kahn's algorithm: the stage must drain, otherwise there is a cycle
+    remaining = {index: set(waits) for index, waits in prerequisites.items()}
+    while remaining:
+        ready = [index for index, waits in remaining.items() if not waits]
+        if not ready:
+            raise ValueError('Circular dependencies between {}'.format(', '.join(
+                sorted(set(str(plan[index].get('operation_id')) for index in remaining)))))
+        for index in ready:
+            del remaining[index]
+        for waits in remaining.values():
+            waits.difference_update(ready)
+    return prerequisites
+
+
+def check_plan(plan):
+    """Raises ValueError if given plan has circular dependencies"""
+    for stage in get_stages(plan):
+        get_prerequisites(plan, stage)
+
+
+def skip(config, failed):
+    """Returns the result of a test skipped because a dependency failed"""
+    return {
+        'config': config,
+        'text': None,
+        'execution_time': -1,
+        'messages': ['Skipped, {} failed!'.format(failed['operation_id'])],
+        'success': False,
+    }
+
+
+def iter_stage(executor, api, plan, stage, concurrency):
+    """
+    Executes one stage, each config once its dependencies completed
+    Yields the plan index and result of each config as soon as it is done.
+    """
+    prerequisites = get_prerequisites(plan, stage)
+    dependents = {index: [] for index in stage}
+    for index, waits in prerequisites.items():
+        for other in waits:
+            dependents[other].append(index)
+    waiting = {index: len(waits) for index, waits in prerequisites.items()}
+    ready = [index for index in stage if not waiting[index]]
+    failed = set()
+    pending = {}
+    try:
+        while ready or pending:
+            done = []
+            while ready and len(pending) < concurrency:
+                index = ready.pop(0)
+                cause = next(
+                    (other for other in prerequisites[index] if other in failed), None)
+                if cause is None:
+                    pending[executor.submit(execute, api, plan[index])] = index
+                else:
+                    done.append((index, skip(plan[index], plan[cause])))
+            if pending and not done:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [(pending.pop(future), future.result()) for future in finished]
+            for index, result in done:
+                if not result['success']:
+                    failed.add(index)
+                yield index, result
+                for other in dependents[index]:
+                    waiting[other] -= 1
+                    if not waiting[other]:
+                        ready.append(other)
+    finally:
+        # Client may have gone away: do not start what is still queued
+        for future in pending:
+            future.cancel()
+
+
+def iter_staged(api, plan, concurrency=None):
+    """
+    Executes the configs of given plan stage by stage on a bounded thread
+    pool, see module docstring
+    Yields the plan index and result of each config as soon as it
+    completes. At most `concurrency` calls are in flight.
+    """
+    concurrency = get_concurrency(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        for stage in get_stages(plan):
+            for item in iter_stage(executor, api, plan, stage, concurrency):
+                yield item
+    finally:
+        executor.shutdown(wait=False)
+
+
+def run_plan(api, plan, concurrency=None):
+    """
+    Executes all configs of given plan stage by stage
+    Returns the results in plan order
+    """
+    results = [None] * len(plan)
+    for index, result in iter_staged(api, plan, concurrency):
+        results[index] = result
+    return results
+
+
+def iter_plan(api, plan, concurrency=None):
+    """
+    Executes all configs of given plan stage by stage
+    Yields each result as soon as it completes. At most `concurrency`
+    calls are in flight.
+    """
+    for _, result in iter_staged(api, plan, concurrency):
+        yield result
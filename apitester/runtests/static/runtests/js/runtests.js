@@ -6,6 +6,14 @@ $(function() {
         return String(id).replace(/\./g, '')
     }
 
+    function formatTimings(timings) {
+        if (!timings) {
+            return '';
+        }
+        var connection = timings['reused'] ? 'reused connection' : `DNS ${timings['dns']} ms, connect ${timings['connect']} ms, TLS ${timings['tls']} ms`;
+        return ` (${connection}, first byte ${timings['ttfb']} ms, transfer ${timings['transfer']} ms)`;
+    }
+
     function runTestCallback (runner, thisRef) {
         return function (data) {
             var alertType = 'success';
@@ -28,7 +36,7 @@ $(function() {
                 collapse = `<button type='button' class='btn btn-xs btn-success pull-right' data-toggle='collapse' data-target='#${stripDotsFromId(data['config']['operation_id'])}' aria-expanded='false'><span class='glyphicon glyphicon-chevron-right'></span><span class='glyphicon glyphicon-chevron-down'></span></button>`;
                 text = `<div id='${stripDotsFromId(data['config']['operation_id'])}' class='collapse'>${text}</div>`;
             }
-            var result =`<div class='alert alert-${alertType}'><div class='row'><div class='col-xs-10 col-sm-11'>${data['config']['summary']}<br />${data['config']['urlpath']}<br />Took ${data['execution_time']} ms<br />${msg}</div><div class='col-xs-2 col-sm-1'>${collapse}</div></div>${text}</div>`;
+            var result =`<div class='alert alert-${alertType}'><div class='row'><div class='col-xs-10 col-sm-11'>${data['config']['summary']}<br />${data['config']['urlpath']}<br />Took ${data['execution_time']} ms${formatTimings(data['timings'])}<br />${msg}</div><div class='col-xs-2 col-sm-1'>${collapse}</div></div>${text}</div>`;
             $(runner.find('.result')).append(result);
         }
     }
@@ -46,10 +54,224 @@ $(function() {
         console.log(thisRef)
 		$.post(testpath,  {
             'json_body': jsonBody,
+            'operation_pk': $(runner).find('input[name="operation_pk"]').val(),
             'csrfmiddlewaretoken': window.CSRF
         }, runTestCallback(runner, thisRef));
 	}
 
+    function runnerOperation(runner) {
+        return {
+            'id': $(runner).find('input[name="operation_pk"]').val(),
+            'urlpath': $(runner).find('input[name="urlpath"]').val(),
+            'json_body': $(runner).find('textarea[name="params"]').val()
+        };
+    }
+
+    function runnerEdit(runner) {
+        return {
+            'id': $(runner).find('input[name="operation_pk"]').val(),
+            'order': $(runner).find('input[name="order"]').val(),
+            'remark': $(runner).find('textarea[name="remark"]').val(),
+            'depends_on': $(runner).find('input[name="depends_on"]').val(),
+            'urlpath': $(runner).find('input[name="urlpath"]').val(),
+            'json_body': $(runner).find('textarea[name="params"]').val()
+        };
+    }
+
+    function saveDirty() {
+        var runners = {};
+        var operations = [];
+        $('.runner.dirty').each(function () {
+            var operation = runnerEdit($(this));
+            runners[operation['id']] = $(this);
+            operations.push(operation);
+        });
+        if (!operations.length) {
+            return;
+        }
+        $.post(URL_RUNTESTS_SAVE_BATCH, {
+            'operations': JSON.stringify(operations),
+            'csrfmiddlewaretoken': window.CSRF
+        }, function (data) {
+            for (var i=0; i < data['results'].length; i++) {
+                var result = data['results'][i];
+                var runner = runners[result['id']];
+                if (result['state'] === 'updated' || result['state'] === 'unchanged') {
+                    runner.removeClass('dirty');
+                    runner.find('button.forSave').next().show().fadeOut(1000);
+                } else {
+                    runner.find('.result').html(`<div class='alert alert-danger'>Not saved: ${escapeHTML(result['state'])}</div>`);
+                }
+            }
+        });
+    }
+
+    function loadTestCallback(runner) {
+        return function (data) {
+            var latency = data['latency'] || {};
+            var alertType = data['errors'] ? 'warning' : 'success';
+            var result = `<div class='alert alert-${alertType}'>${escapeHTML(data['config']['summary'])}<br />${escapeHTML(data['config']['urlpath'])}<br />
+                ${data['requests']} requests by ${data['users']} users in ${data['duration']} s: ${data['throughput']} requests/s<br />
+                Errors: ${data['errors']} (${(data['error_rate'] * 100).toFixed(1)}%), status codes: ${escapeHTML(JSON.stringify(data['status_codes']))}<br />
+                Latency: p50 ${latency['p50']} ms, p90 ${latency['p90']} ms, p99 ${latency['p99']} ms, max ${latency['max']} ms</div>`;
+            $(runner.find('.result')).html(result);
+        }
+    }
+
+    function loadTest(runner) {
+        var operation = runnerOperation(runner);
+        $(runner).find('.result').html(`<div class='alert alert-info'>Load test running ...</div>`);
+        $.post(URL_RUNTESTS_RUN_LOAD, {
+            'operation': operation['id'],
+            'urlpath': operation['urlpath'],
+            'json_body': operation['json_body'],
+            'users': $('#loadUsers').val(),
+            'requests': $('#loadRequests').val(),
+            'duration': $('#loadDuration').val(),
+            'csrfmiddlewaretoken': window.CSRF
+        }, loadTestCallback(runner)).fail(function (xhr) {
+            $(runner).find('.result').html(`<div class='alert alert-danger'>${escapeHTML(xhr.responseText)}</div>`);
+        });
+    }
+
+    function openLoopCallback(data) {
+        var lag = data['lag'] || {};
+        var responseTime = data['response_time'] || {};
+        var alertType = data['errors'] || lag['p99'] > 100 ? 'warning' : 'success';
+        var report = `<div class='alert alert-${alertType}'>
+            ${data['requests']} of ${data['intended_requests']} intended requests (${escapeHTML(data['arrival'])}) in ${data['duration']} s: ${data['throughput']} requests/s<br />
+            Errors: ${data['errors']} (${(data['error_rate'] * 100).toFixed(1)}%), status codes: ${escapeHTML(JSON.stringify(data['status_codes']))}<br />
+            Schedule lag: p50 ${lag['p50']} ms, p99 ${lag['p99']} ms, max ${lag['max']} ms<br />
+            Response time from intended send: p50 ${responseTime['p50']} ms, p90 ${responseTime['p90']} ms, p99 ${responseTime['p99']} ms, max ${responseTime['max']} ms</div>`;
+        $('#load-report').html(report);
+    }
+
+    function runOpenLoop(operations) {
+        $('#load-report').html(`<div class='alert alert-info'>Load test running ...</div>`);
+        $.post(URL_RUNTESTS_RUN_OPEN, {
+            'operations': JSON.stringify(operations),
+            'rate': $('#openRate').val(),
+            'duration': $('#loadDuration').val(),
+            'arrival': $('#openArrival').val(),
+            'stages': $('#openStages').val(),
+            'csrfmiddlewaretoken': window.CSRF
+        }, openLoopCallback).fail(function (xhr) {
+            $('#load-report').html(`<div class='alert alert-danger'>${escapeHTML(xhr.responseText)}</div>`);
+        });
+    }
+
+    function runBatch(operations, runners) {
+        $.post(URL_RUNTESTS_RUN_BATCH, {
+            'operations': JSON.stringify(operations),
+            'csrfmiddlewaretoken': window.CSRF
+        }, function (data) {
+            for (var i=0; i < data['results'].length; i++) {
+                var result = data['results'][i];
+                runTestCallback(runners[result['config']['runner']])(result);
+            }
+        }).fail(function (xhr) {
+            $('#load-report').html(`<div class='alert alert-danger'>${escapeHTML(xhr.responseText)}</div>`);
+        });
+    }
+
+    function handleRunEvent(event, runners) {
+        var name = 'message';
+        var data = '';
+        var lines = event.split('\n');
+        for (var i=0; i < lines.length; i++) {
+            if (lines[i].indexOf('event: ') === 0) {
+                name = lines[i].substr(7);
+            } else if (lines[i].indexOf('data: ') === 0) {
+                data += lines[i].substr(6);
+            }
+        }
+        if (name === 'result') {
+            var result = JSON.parse(data);
+            runTestCallback(runners[result['config']['runner']])(result);
+        }
+    }
+
+    function runStream(operations, runners) {
+        var body = new FormData();
+        body.append('operations', JSON.stringify(operations));
+        body.append('csrfmiddlewaretoken', window.CSRF);
+        fetch(URL_RUNTESTS_RUN_STREAM, {
+            'method': 'POST',
+            'body': body,
+            'credentials': 'same-origin'
+        }).then(function (response) {
+            if (!response.ok) {
+                return response.text().then(function (text) {
+                    $('#load-report').html(`<div class='alert alert-danger'>${escapeHTML(text)}</div>`);
+                });
+            }
+            var reader = response.body.getReader();
+            var decoder = new TextDecoder();
+            var buffer = '';
+            function read() {
+                return reader.read().then(function (chunk) {
+                    if (chunk.done) {
+                        return;
+                    }
+                    buffer += decoder.decode(chunk.value, {'stream': true});
+                    var events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    for (var i=0; i < events.length; i++) {
+                        handleRunEvent(events[i], runners);
+                    }
+                    return read();
+                });
+            }
+            return read();
+        });
+    }
+
+    function renderRunner(call) {
+        var params = '';
+        if (call['method'] === 'post' || call['method'] === 'put') {
+            params = `<textarea class="form-control" name="params" cols="20" rows="5">${escapeHTML(call['params'])}</textarea>`;
+        }
+        var latency = '';
+        if (call['latency']) {
+            var stats = call['latency'];
+            latency = `<div class="latency text-muted small" title="Latency of ${stats['count']} successful calls">p50 ${stats['p50']} ms<br />p90 ${stats['p90']} ms<br />p99 ${stats['p99']} ms<br />max ${stats['max']} ms</div>`;
+        }
+        return `<div><li class="runner"><div class="row">
+            <div class="col-xs-5 col-sm-2"><div class="checkbox"><label><input type="checkbox" checked="checked" /> <textarea class="form-control" name="remark" cols="20" rows="5">${escapeHTML(call['summary'])}</textarea></label><input type="hidden" value="${escapeHTML(call['operationId'])}"></div></div>
+            <div class="col-xs-5"><input class="form-control" type="text" name="urlpath" size="50" value="${escapeHTML(call['urlpath'])}"><input class="form-control" type="hidden" name="testconfig_pk" size="1" value="${escapeHTML(window.CURRENT_PROFILE_ID)}" /></div>
+            <div class="col-xs-3">${params}</div>
+            <div class="col-xs-1">order: <input class="form-control" type="text" name="order" size="1" value="${escapeHTML(call['order'])}" />
+                after: <input class="form-control" type="text" name="depends_on" size="1" value="${escapeHTML(call['depends_on'])}" title="Comma-separated operation ids of the same order to run first" /></div>
+            <div class="col-xs-1"><input class="form-control" type="hidden" name="replica_id" size="1" value="${escapeHTML(call['replica_id'])}" /><input type="hidden" name="operation_pk" value="${escapeHTML(call['id'])}" /></div>
+            <div class="col-xs-1">${escapeHTML(call['method'].toUpperCase())}<input class="form-control" type="hidden" name="method" size="1" value="${escapeHTML(call['method'])}" />${latency}</div>
+            <div class="col-xs-1 col-sm-1">
+                <button class="btn btn-success forTest" style="width:65px"> Run </button>
+                <button class="btn btn-default forLoad" style="width:65px">Load </button>
+                <button class="btn btn-default forCopy" style="width:65px">Copy </button>
+                <button class="btn btn-default forDelete" style="width:65px">Delete</button>
+                <button class="btn btn-default forSave" style="width:65px">Save </button><span style="display: none;margin-left: 5px;background-color:#00cc00">saved.</span>
+            </div>
+            <div class="col-xs-12 col-sm-9 result"></div>
+        </div></li></div>`;
+    }
+
+    function loadMore(button) {
+        var cursor = button.data('cursor');
+        button.prop('disabled', true);
+        $.getJSON(URL_RUNTESTS_OPERATIONS, {'cursor': cursor}, function (data) {
+            var html = '';
+            for (var i=0; i < data['operations'].length; i++) {
+                html += renderRunner(data['operations'][i]);
+            }
+            $('#test-list').append(html);
+            if (data['next_cursor']) {
+                button.data('cursor', data['next_cursor']).prop('disabled', false);
+            } else {
+                button.addClass('hide');
+            }
+        });
+    }
+
     function deleteTest(runner){
         var item_list = $(runner).parent();
         jsonBody = $(runner).find('textarea[name="params"]').val();
@@ -75,19 +297,30 @@ $(function() {
 
 	$('#run').click(function() {
 		$('.result').empty();
-		var runners = $('.runner');
-		var runNum =$('#numRun');
-		for(var j=0; j < $(runNum).val(); j++){
-            for (var i=0; i < runners.length; i++) {
-                var runner = $(runners[i]);
-                if (runner.find('input').is(':checked')) {
-                    runTest(runner);
-                }
+		var runners = {};
+		var operations = [];
+		$('.runner').each(function (index) {
+            var runner = $(this);
+            if (runner.find('input').is(':checked')) {
+                // Copies share an operation until reloaded, results go by runner
+                var operation = runnerOperation(runner);
+                operation['runner'] = index;
+                runners[index] = runner;
+                operations.push(operation);
+            }
+		});
+		var runNum = parseInt($('#numRun').val()) || 1;
+		var streaming = window.fetch && window.ReadableStream && window.TextDecoder;
+		for(var j=0; j < runNum; j++){
+            if (streaming) {
+                runStream(operations, runners);
+            } else {
+                runBatch(operations, runners);
             }
 		}
 	});
 
-	$('.runner button.forTest').click(function() {
+	$('#test-list').on('click', '.runner button.forTest', function() {
 		var runner = $(this).parent().parent().parent();
 		$(runner).find('.result').empty();
 		$(this).removeClass('btn-success')
@@ -96,7 +329,7 @@ $(function() {
 		runTest(runner, this);
 	});
 
-    $('.runner button.forSave').click(function() {
+    $('#test-list').on('click', '.runner button.forSave', function() {
     	var t = $(this);
         var runner = $(this).parent().parent().parent();
         jsonBody = $(runner).find('textarea[name="params"]').val();
@@ -116,6 +349,7 @@ $(function() {
 			'replica_id':replica_id,
 			'remark':remark,
 			'method':testmethod,
+			'depends_on': $(runner).find('input[name="depends_on"]').val(),
             'csrfmiddlewaretoken': window.CSRF
 		}, function (response) {
         	t.next().show().fadeOut(1000);
@@ -123,7 +357,7 @@ $(function() {
         });
     });
 
-    $('.runner button.forCopy').click(function() {
+    $('#test-list').on('click', '.runner button.forCopy', function() {
         var t = $(this);
         var runner = $(this).parent().parent().parent();
         var item_list = $(runner).parent();
@@ -146,15 +380,45 @@ $(function() {
 			'method':testmethod,
             'csrfmiddlewaretoken': window.CSRF
 		}, function (response) {
-		    $(item_list).clone(true).insertAfter($(item_list));
+		    var copy = $(item_list).clone(true).insertAfter($(item_list));
+		    copy.find('input[name="operation_pk"]').val(response['id']);
+		    copy.find('input[name="replica_id"]').val(response['replica_id']);
         });
     });
 
-    $('.runner button.forDelete').click(function() {
+    $('#test-list').on('click', '.runner button.forLoad', function() {
+        var runner = $(this).parent().parent().parent();
+        loadTest(runner);
+    });
+
+    $('#test-list').on('click', '.runner button.forDelete', function() {
         var runner = $(this).parent().parent().parent();
         deleteTest(runner)
 	});
 
+	$('#runOpenLoop').click(function() {
+		var operations = [];
+		$('.runner').each(function () {
+            var runner = $(this);
+            if (runner.find('input').is(':checked')) {
+                operations.push(runnerOperation(runner));
+            }
+		});
+		runOpenLoop(operations);
+	});
+
+	$('#test-list').on('input', '.runner input[type="text"], .runner textarea', function() {
+		$(this).closest('.runner').addClass('dirty');
+	});
+
+	$('#saveAll').click(function() {
+		saveDirty();
+	});
+
+	$('#load-more').click(function() {
+		loadMore($(this));
+	});
+
 	$('#checkNone').click(function() {
 		$('.runner').find('input').prop('checked', false);
 	});
@@ -200,5 +464,6 @@ $(function() {
         $('#select-testconfig').val(configPk);
         $('#run-buttons').removeClass('hide');
         $('#test-list').removeClass('hide');
+        $('#load-more').removeClass('hide');
     }
 });
@@ -5,7 +5,34 @@ when you run "manage.py test".
 Replace this with more appropriate tests for your application.
 """
 
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from datetime import timedelta
+
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from obp.api import API, APIError
+
+from .benchmark import (
+    BENCHMARKS, describe_documents, find_regressions, load_document, run_benchmarks,
+    scale_document)
+from .bodies import get_request_body
+from .histogram import LatencyHistogram, get_bucket, get_bucket_range
+from .history import RunRecorder, purge_history
+from .load import ClosedLoop, OpenLoop, iter_schedule, parse_stages
+from .models import ProfileOperation, TestConfiguration, TestRun
+from .runner import check_plan, expected_status_code, iter_plan, run_plan
+from .views import (
+    get_operations_page, profileOperation_bulk_insert, profileOperation_bulk_update)
 
 
 class SimpleTest(TestCase):
@@ -14,3 +41,675 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class FakeResponse(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.execution_time = 1
+        self.text = ''
+        self.content = b''
+        self.timings = {
+            'dns': 0.0, 'connect': 0.0, 'tls': 0.0, 'ttfb': 0.8,
+            'transfer': 0.2, 'total': 1.0, 'reused': True,
+        }
+
+    def json(self):
+        return {}
+
+
+class FakeAPI(object):
+    """Answers every call with 200"""
+    def call(self, method='GET', url='', payload=None, operation_id=None,
+             api_version=None):
+        return FakeResponse(200)
+
+
+class StagedPlanTest(SimpleTestCase):
+    class RecordingAPI(object):
+        """Records the order of calls, fails calls to /fail"""
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.calls = []
+
+        def call(self, method='GET', url='', payload=None, operation_id=None,
+                 api_version=None):
+            with self.lock:
+                self.calls.append(url.rsplit('/', 1)[-1])
+            return FakeResponse(500 if url.endswith('fail') else 200)
+
+    def make_config(self, operation_id, order, depends_on=(), path=None):
+        return {
+            'found': True,
+            'method': 'get',
+            'status_code': 200,
+            'urlpath': '/{}'.format(path or operation_id),
+            'operation_id': operation_id,
+            'order': order,
+            'depends_on': list(depends_on),
+        }
+
+    def test_stages_and_dependencies(self):
+        plan = [
+            self.make_config('getBank', 2, ['createBank']),
+            self.make_config('createBank', 2, path='fail'),
+            self.make_config('getBanks', 2),
+            self.make_config('root', 1),
+        ]
+        api = self.RecordingAPI()
+        results = run_plan(api, plan, 4)
+        self.assertEqual(api.calls[0], 'root')
+        self.assertNotIn('getBank', api.calls)
+        self.assertEqual(results[0]['messages'], ['Skipped, createBank failed!'])
+        self.assertTrue(results[2]['success'])
+
+    def test_circular_dependencies(self):
+        plan = [
+            self.make_config('a', 1, ['b']),
+            self.make_config('b', 1, ['a']),
+            self.make_config('c', 2, ['a']),
+        ]
+        with self.assertRaises(ValueError):
+            check_plan(plan)
+        check_plan(plan[2:])
+
+
+class ClosedLoopTest(SimpleTestCase):
+    config = {
+        'found': True,
+        'method': 'post',
+        'status_code': 201,
+        'urlpath': '/obp/v5.1.0/banks',
+        'payload': '{}',
+    }
+
+    def test_stops_after_requests(self):
+        report = ClosedLoop(FakeAPI(), self.config, users=4, requests=25).run()
+        self.assertEqual(report['requests'], 25)
+        self.assertEqual((report['errors'], report['error_rate']), (25, 1))
+        self.assertEqual(report['status_codes'], {'200': 25})
+        self.assertIsNone(report['latency'])
+
+    def test_stops_after_duration(self):
+        config = dict(self.config, method='get', status_code=200)
+        report = ClosedLoop(FakeAPI(), config, users=2, duration=0.05).run()
+        self.assertGreater(report['requests'], 0)
+        self.assertEqual(report['latency']['max'], 1)
+        self.assertGreater(report['throughput'], 0)
+
+    def test_requires_a_limit(self):
+        with self.assertRaises(ValueError):
+            ClosedLoop(FakeAPI(), self.config, users=2)
+
+
+class OpenLoopTest(SimpleTestCase):
+    def test_schedules(self):
+        constant = list(iter_schedule(parse_stages(rate=10, duration=2)))
+        self.assertEqual(len(constant), 20)
+        self.assertAlmostEqual(constant[1] - constant[0], 0.1)
+        staged = list(iter_schedule(parse_stages([[2, 10], [2, 10], [2, 0]])))
+        self.assertEqual(len(staged), 40)
+        # Arrivals are sparse while ramping up and dense while holding
+        self.assertGreater(staged[1] - staged[0], staged[-20] - staged[-21])
+        poisson = list(iter_schedule(
+            parse_stages(rate=1000, duration=2), 'poisson', seed=1))
+        self.assertAlmostEqual(len(poisson), 2000, delta=200)
+        with self.assertRaises(ValueError):
+            parse_stages([[0, 10]])
+
+    def test_skips_idle_stages(self):
+        self.assertEqual(list(iter_schedule(parse_stages([[1, 0]]))), [])
+        schedule = list(iter_schedule(parse_stages([[5, 0], [5, 10]])))
+        self.assertEqual(len(schedule), 25)
+        self.assertGreaterEqual(schedule[0], 5)
+        for rate in [0, -1]:
+            with self.assertRaises(ValueError):
+                parse_stages(rate=rate)
+
+    @override_settings(OPEN_LOOP_DEFAULT_DURATION=3)
+    def test_defaults_duration(self):
+        self.assertEqual(parse_stages(rate=10), [(3.0, 10.0, 10.0)])
+
+    def test_reports_schedule_lag(self):
+        plan = [{
+            'found': True,
+            'method': 'get',
+            'status_code': 200,
+            'urlpath': '/obp/v5.1.0/banks',
+            'payload': '',
+        }]
+        stages = parse_stages(rate=200, duration=0.1)
+        report = OpenLoop(FakeAPI(), plan, stages).run()
+        self.assertEqual(report['requests'], 20)
+        self.assertNotIn('timeline', report)
+        recorder = mock.Mock()
+        report = OpenLoop(FakeAPI(), plan, stages, timeline=True).run(recorder)
+        self.assertEqual(recorder.add.call_count, 20)
+        # Response bodies are not kept
+        self.assertNotIn('text', recorder.add.call_args[0][0])
+        self.assertEqual(report['intended_requests'], 20)
+        self.assertEqual(len(report['timeline']), 20)
+        intended, sent, latency = report['timeline'][-1]
+        self.assertGreaterEqual(sent, intended)
+        self.assertIsNotNone(report['lag'])
+
+
+class RunPlanTest(TestCase):
+    def make_plan(self, methods):
+        return [{
+            'found': True,
+            'id': index,
+            'method': method,
+            'status_code': expected_status_code(method),
+            'urlpath': '/obp/v5.1.0/banks',
+            'payload': '{}',
+        } for index, method in enumerate(methods)]
+
+    def test_results_in_plan_order(self):
+        plan = self.make_plan(['get', 'post', 'get', 'delete'])
+        results = run_plan(FakeAPI(), plan, 3)
+        self.assertEqual([r['config']['id'] for r in results], [0, 1, 2, 3])
+        self.assertEqual(
+            [r['success'] for r in results], [True, False, True, False])
+        self.assertEqual(
+            results[1]['messages'], ['Status code is 200, but expected 201!'])
+
+    def test_expected_status_codes(self):
+        self.assertEqual(expected_status_code('post'), 201)
+        self.assertEqual(expected_status_code('post', [200, 201]), 201)
+        self.assertEqual(expected_status_code('post', [200]), 200)
+        self.assertEqual(expected_status_code('delete', []), 204)
+
+    def test_iter_plan_yields_every_result(self):
+        plan = self.make_plan(['get'] * 10)
+        results = list(iter_plan(FakeAPI(), plan, 2))
+        self.assertEqual(
+            sorted(r['config']['id'] for r in results), list(range(10)))
+
+
+class ProfileViewTestCase(TestCase):
+    """Logged-in owner of a profile with calls to the API answered by FakeAPI"""
+
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.profile = TestConfiguration.objects.create(
+            name='p', owner=self.owner, api_version='OBPv4.0.0', bank_id='gh.29.uk')
+        self.operation = ProfileOperation.objects.create(
+            profile=self.profile, operation_id='OBPv4.0.0-getBanks', json_body='',
+            urlpath='/obp/v4.0.0/banks', remark='Get Banks', method='get')
+        self.client.force_login(self.owner)
+        patcher = mock.patch.object(API, 'call', side_effect=FakeAPI().call)
+        self.call = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.index = {}
+        patcher = mock.patch.object(
+            API, 'get_swagger_index', side_effect=lambda *args: self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, name, data):
+        return self.client.post(
+            reverse(name, kwargs={'testconfig_pk': self.profile.pk}), data)
+
+
+class RunViewTest(ProfileViewTestCase):
+    def test_records_clicked_replica(self):
+        replica = ProfileOperation.objects.create(
+            profile=self.profile, operation_id='OBPv4.0.0-getBanks', json_body='',
+            urlpath='/obp/v4.0.0/banks', remark='Copy', method='get', replica_id=2)
+        response = self.client.post(reverse('runtests-run', kwargs={
+            'testmethod': 'get', 'testpath': '/obp/v4.0.0/banks',
+            'testconfig_pk': self.profile.pk, 'operation_id': 'OBPv4.0.0-getBanks',
+        }), {'operation_pk': replica.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        result = self.profile.runs.get().results.get()
+        self.assertEqual(result.profile_operation_id, replica.pk)
+        replica.refresh_from_db()
+        self.operation.refresh_from_db()
+        self.assertEqual(replica.latency_histogram.summary()['count'], 1)
+        self.assertIsNone(self.operation.latency_histogram.summary())
+
+
+class BatchRunViewTest(ProfileViewTestCase):
+    def test_runs_every_runner(self):
+        operations = [
+            {'id': self.operation.pk, 'runner': 0},
+            {'id': self.operation.pk, 'runner': 3, 'urlpath': '/obp/v4.0.0/banks?copy'},
+        ]
+        response = self.post(
+            'runtests-run-batch', {'operations': json.dumps(operations)})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['config']['runner'] for r in results], [0, 3])
+        self.assertEqual(
+            results[1]['config']['urlpath'], '/obp/v4.0.0/banks?copy')
+        self.assertEqual(self.call.call_count, 2)
+        self.assertEqual(self.profile.runs.get().results.count(), 2)
+
+    def test_expects_indexed_status_code(self):
+        self.operation.method = 'post'
+        self.operation.save()
+        self.index = {'OBPv4.0.0-getBanks': {'method': 'post', 'status_codes': [200]}}
+        response = self.post(
+            'runtests-run-batch', {'operations': json.dumps([{'id': self.operation.pk}])})
+        result = response.json()['results'][0]
+        self.assertEqual(result['config']['status_code'], 200)
+        self.assertTrue(result['success'])
+
+    def test_refuses_other_profiles(self):
+        self.client.force_login(User.objects.create(username='other'))
+        response = self.post(
+            'runtests-run-batch', {'operations': json.dumps([{'id': self.operation.pk}])})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.call.call_count, 0)
+
+    def test_finishes_run_on_errors(self):
+        operations = [{'id': self.operation.pk}]
+        with mock.patch('runtests.views.run_plan', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), self.assertLogs('django.request'):
+                self.post('runtests-run-batch', {'operations': json.dumps(operations)})
+        self.assertIsNotNone(self.profile.runs.get().finished)
+
+
+class StreamRunViewTest(ProfileViewTestCase):
+    def get_events(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.endswith('\n\n'))
+        events = []
+        for block in content[:-2].split('\n\n'):
+            name, data = block.split('\n')
+            self.assertTrue(name.startswith('event: '))
+            self.assertTrue(data.startswith('data: '))
+            events.append((name[7:], json.loads(data[6:])))
+        return events
+
+    def test_streams_and_records_results(self):
+        operations = [
+            {'id': self.operation.pk, 'runner': 0},
+            {'id': self.operation.pk, 'runner': 1},
+        ]
+        response = self.post(
+            'runtests-run-stream', {'operations': json.dumps(operations)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        events = self.get_events(response)
+        self.assertEqual([name for name, _ in events], ['result', 'result', 'end'])
+        self.assertEqual(
+            sorted(data['config']['runner'] for _, data in events[:2]), [0, 1])
+        self.assertEqual(events[2][1], {'count': 2})
+        run = self.profile.runs.get()
+        self.assertIsNotNone(run.finished)
+        self.assertEqual(run.results.count(), 2)
+
+    def test_refuses_other_profiles_and_invalid_input(self):
+        self.client.force_login(User.objects.create(username='other'))
+        operations = json.dumps([{'id': self.operation.pk}])
+        self.assertEqual(
+            self.post('runtests-run-stream', {'operations': operations}).status_code, 403)
+        self.client.force_login(self.owner)
+        self.assertEqual(
+            self.post('runtests-run-stream', {'operations': '[{"id": "x"}]'}).status_code,
+            400)
+        # Circular dependencies
+        self.operation.depends_on = 'OBPv4.0.0-getBank'
+        self.operation.save()
+        other = ProfileOperation.objects.create(
+            profile=self.profile, operation_id='OBPv4.0.0-getBank', json_body='',
+            urlpath='/obp/v4.0.0/banks/BANK_ID', remark='', method='get',
+            depends_on='OBPv4.0.0-getBanks')
+        operations = json.dumps([{'id': self.operation.pk}, {'id': other.pk}])
+        self.assertEqual(
+            self.post('runtests-run-stream', {'operations': operations}).status_code, 400)
+        self.assertFalse(self.profile.runs.exists())
+
+
+class LoadTestViewTest(ProfileViewTestCase):
+    def test_reports_and_records_load_test(self):
+        response = self.post('runtests-run-load', {
+            'operation': self.operation.pk, 'users': 2, 'requests': 5})
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['users'], report['requests'], report['errors']), (2, 5, 0))
+        self.assertEqual(report['config']['id'], self.operation.pk)
+        run = self.profile.runs.get()
+        self.assertEqual((run.concurrency, run.results.count()), (2, 5))
+        self.assertIsNotNone(run.finished)
+
+    def test_refuses_invalid_input(self):
+        self.assertEqual(
+            self.post('runtests-run-load', {'operation': self.operation.pk}).status_code,
+            400)
+        self.assertEqual(
+            self.post('runtests-run-load', {'operation': 0, 'requests': 1}).status_code,
+            400)
+        self.client.force_login(User.objects.create(username='other'))
+        self.assertEqual(self.post('runtests-run-load', {
+            'operation': self.operation.pk, 'requests': 1}).status_code, 403)
+
+
+class OpenLoopViewTest(ProfileViewTestCase):
+    def test_reports_and_records_open_loop(self):
+        operations = json.dumps([{'id': self.operation.pk}])
+        response = self.post('runtests-run-open', {
+            'operations': operations, 'rate': 100, 'duration': 0.05})
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['requests'], report['intended_requests']), (5, 5))
+        self.assertNotIn('timeline', report)
+        self.assertEqual(self.profile.runs.get().results.count(), 5)
+        response = self.post('runtests-run-open', {
+            'operations': operations, 'rate': 100, 'duration': 0.05, 'timeline': 1})
+        self.assertEqual(len(response.json()['timeline']), 5)
+
+    def test_refuses_invalid_input(self):
+        operations = json.dumps([{'id': self.operation.pk}])
+        for data in [{'rate': 0}, {'stages': '[[1, -1]]'}, {'rate': 1, 'arrival': 'burst'}]:
+            response = self.post('runtests-run-open', dict(data, operations=operations))
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            self.post('runtests-run-open', {'operations': '[]', 'rate': 1}).status_code,
+            400)
+        self.assertFalse(self.profile.runs.exists())
+
+
+class TestConfigurationFormViewTest(ProfileViewTestCase):
+    @override_settings(API_VERSIONS_FALLBACK=['OBPv5.1.0', 'BGv1.3'])
+    def test_offers_fallback_versions_if_api_is_down(self):
+        with mock.patch(
+                'runtests.views.catalogue.get_versions', side_effect=APIError('down')):
+            response = self.client.get(reverse(
+                'runtests-testconfig-update', kwargs={'pk': self.profile.pk}))
+        choices = response.context['form'].fields['api_version'].choices
+        self.assertEqual([value for value, _ in choices], ['', 'BGv1.3', 'OBPv5.1.0'])
+
+
+class RequestBodyTest(SimpleTestCase):
+    swagger = {'definitions': {
+        'AccountJson': {
+            'required': ['bank_id', 'label', 'balance', 'owners', 'parent'],
+            'properties': {
+                'bank_id': {'type': 'string', 'example': 'gh.29.uk'},
+                'label': {'type': 'string', 'example': 'Label'},
+                'balance': {'$ref': '#/definitions/AmountJson'},
+                'owners': {'type': 'array', 'items': {'$ref': '#/definitions/UserJson'}},
+                'parent': {'$ref': '#/definitions/AccountJson'},
+            },
+        },
+        'AmountJson': {
+            'required': ['currency', 'amount'],
+            'properties': {
+                'currency': {'type': 'string', 'example': 'EUR'},
+                'amount': {'type': 'string', 'example': '0'},
+            },
+        },
+        'UserJson': {
+            'required': ['user_id'],
+            'properties': {},
+        },
+    }}
+
+    def test_resolves_nested_refs_and_profile_variables(self):
+        testconfig = TestConfiguration(bank_id='my.bank', user_id='u1')
+        body = get_request_body(self.swagger, 'AccountJson', testconfig)
+        self.assertEqual(json.loads(body), {
+            'bank_id': 'my.bank',
+            'label': 'Label',
+            'balance': {'currency': 'EUR', 'amount': '0'},
+            'owners': [{'user_id': 'u1'}],
+            'parent': None,
+        })
+
+    def test_unknown_definition(self):
+        self.assertEqual(get_request_body(self.swagger, None, None), '')
+        self.assertEqual(get_request_body(self.swagger, 'Nope', None), '')
+
+
+class UrlpathTest(SimpleTestCase):
+    def test_expands_placeholders_in_one_pass(self):
+        testconfig = TestConfiguration(bank_id='gh.29.uk', account_id='ACCOUNT_ID_1')
+        self.assertEqual(
+            testconfig.urlpath_expander.expand(
+                '/banks/{BANK_ID}/accounts/ACCOUNT_ID/VIEW_ID/OTHER_BANK_ID'),
+            '/banks/gh.29.uk/accounts/ACCOUNT_ID_1/1/OTHER_BANK_ID')
+
+
+
+class UrlpathCacheTest(TestCase):
+    def test_save_invalidates_expander(self):
+        owner = User.objects.create(username='owner')
+        testconfig = TestConfiguration(name='p', owner=owner, bank_id='a')
+        self.assertEqual(testconfig.urlpath_expander.expand('/BANK_ID'), '/a')
+        testconfig.bank_id = 'b'
+        testconfig.save()
+        self.assertEqual(testconfig.urlpath_expander.expand('/BANK_ID'), '/b')
+
+
+class BulkInsertTest(TestCase):
+    def test_creates_updates_and_skips(self):
+        owner = User.objects.create(username='owner')
+        profile = TestConfiguration.objects.create(name='p', owner=owner)
+        ProfileOperation.objects.create(
+            profile=profile, operation_id='getBanks', json_body='',
+            urlpath='/banks', remark='Get Banks', method='get')
+        ProfileOperation.objects.create(
+            profile=profile, operation_id='getBank', json_body='',
+            urlpath='/banks/BANK_ID', remark='Old', method='get')
+        counts = profileOperation_bulk_insert(profile.pk, [
+            {'operation_id': 'getBanks', 'json_body': '', 'urlpath': '/banks',
+             'remark': 'Get Banks', 'method': 'get'},
+            {'operation_id': 'getBank', 'json_body': '', 'urlpath': '/banks/BANK_ID',
+             'remark': 'Get Bank', 'method': 'get'},
+            {'operation_id': 'createBank', 'json_body': '{}', 'urlpath': '/banks',
+             'remark': 'Create Bank', 'method': 'post'},
+        ])
+        self.assertEqual(counts, {'created': 1, 'updated': 1, 'skipped': 1})
+        self.assertEqual(
+            ProfileOperation.objects.get(operation_id='getBank').remark, 'Get Bank')
+        self.assertEqual(profile.operations.count(), 3)
+
+
+class BulkUpdateTest(TestCase):
+    def test_outcomes(self):
+        owner = User.objects.create(username='owner')
+        profile = TestConfiguration.objects.create(name='p', owner=owner)
+        other = TestConfiguration.objects.create(name='o', owner=owner)
+        kwargs = {'operation_id': 'getBanks', 'json_body': '', 'urlpath': '/banks',
+                  'remark': 'Get Banks', 'method': 'get'}
+        first = ProfileOperation.objects.create(profile=profile, **kwargs)
+        second = ProfileOperation.objects.create(profile=profile, replica_id=2, **kwargs)
+        third = ProfileOperation.objects.create(profile=profile, replica_id=3, **kwargs)
+        fourth = ProfileOperation.objects.create(profile=profile, replica_id=4, **kwargs)
+        fifth = ProfileOperation.objects.create(profile=profile, replica_id=5, **kwargs)
+        sixth = ProfileOperation.objects.create(profile=profile, replica_id=6, **kwargs)
+        seventh = ProfileOperation.objects.create(profile=profile, replica_id=7, **kwargs)
+        foreign = ProfileOperation.objects.create(profile=other, **kwargs)
+        outcomes = profileOperation_bulk_update(profile.pk, {
+            first.pk: {'order': '5', 'remark': 'First'},
+            second.pk: {'remark': 'Get Banks'},
+            third.pk: {'order': 'x'},
+            fourth.pk: {'json_body': {'a': 1}},
+            fifth.pk: {'urlpath': '/banks' * 100},
+            sixth.pk: {'order': None},
+            seventh.pk: {'json_body': None, 'depends_on': None},
+            foreign.pk: {'remark': 'Foreign'},
+        })
+        self.assertEqual(outcomes, {
+            first.pk: 'updated', second.pk: 'unchanged',
+            third.pk: 'invalid', fourth.pk: 'invalid', fifth.pk: 'invalid',
+            sixth.pk: 'invalid', seventh.pk: 'invalid', foreign.pk: 'missing'})
+        fourth.refresh_from_db()
+        self.assertEqual(fourth.json_body, '')
+        first.refresh_from_db()
+        self.assertEqual((first.order, first.remark), (5, 'First'))
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.remark, 'Get Banks')
+
+
+@override_settings(OPERATIONS_PAGE_SIZE=2)
+class OperationsPageTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.profile = TestConfiguration.objects.create(
+            name='p', owner=self.owner, bank_id='gh.29.uk')
+        for i, save_time in enumerate([30, 20, 20, 10]):
+            ProfileOperation.objects.create(
+                profile=self.profile, operation_id='op{}'.format(i), json_body='',
+                urlpath='/banks/BANK_ID', remark='', method='get',
+                save_time=save_time)
+        ProfileOperation.objects.create(
+            profile=self.profile, operation_id='deleted', json_body='',
+            urlpath='/banks', remark='', method='get', is_deleted=1, save_time=40)
+
+    def test_pages_with_cursor(self):
+        calls, cursor = get_operations_page(self.profile)
+        self.assertEqual([call['operationId'] for call in calls], ['op0', 'op1'])
+        self.assertEqual(calls[0]['urlpath'], '/banks/gh.29.uk')
+        calls, cursor = get_operations_page(self.profile, cursor)
+        self.assertEqual([call['operationId'] for call in calls], ['op2', 'op3'])
+        self.assertIsNone(cursor)
+        with self.assertRaises(ValueError):
+            get_operations_page(self.profile, 'invalid')
+
+    def test_feed_is_conditional(self):
+        self.client.force_login(self.owner)
+        url = reverse('runtests-operations', kwargs={'testconfig_pk': self.profile.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['operations']), 2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, {'cursor': 'x'}).status_code, 400)
+
+
+@override_settings(RUN_HISTORY_BUFFER=2, RUN_HISTORY_DAYS=30)
+class RunRecorderTest(TestCase):
+    def make_result(self, operation, success=True):
+        return {
+            'config': {'id': operation.pk, 'operation_id': operation.operation_id,
+                       'method': 'get', 'urlpath': '/banks'},
+            'status_code': 200 if success else 500,
+            'success': success,
+            'execution_time': 12,
+            'response_size': 34,
+            'messages': [] if success else ['Status code is 500, but expected 200!'],
+        }
+
+    def test_records_buffered_results(self):
+        owner = User.objects.create(username='owner')
+        profile = TestConfiguration.objects.create(name='p', owner=owner)
+        operation = ProfileOperation.objects.create(
+            profile=profile, operation_id='getBanks', json_body='',
+            urlpath='/banks', remark='', method='get')
+        recorder = RunRecorder(profile, concurrency=4)
+        recorder.add(self.make_result(operation))
+        self.assertEqual(recorder.run.results.count(), 0)
+        recorder.add(self.make_result(operation, success=False))
+        self.assertEqual(recorder.run.results.count(), 2)
+        recorder.add(self.make_result(operation))
+        run = recorder.finish()
+        self.assertIsNotNone(run.finished)
+        self.assertEqual(run.results.count(), 3)
+        failed = run.results.get(success=False)
+        self.assertEqual((failed.status_code, failed.response_size), (500, 34))
+        self.assertIn('expected 200', failed.error)
+
+        self.assertEqual(run.latency_histogram.summary()['count'], 2)
+        operation.refresh_from_db()
+        self.assertEqual(operation.latency_histogram.percentile(50), 12)
+
+        TestRun.objects.filter(pk=run.pk).update(
+            started=timezone.now() - timedelta(days=31))
+        purge_history()
+        self.assertFalse(TestRun.objects.exists())
+
+
+class LatencyHistogramTest(SimpleTestCase):
+    def test_buckets_cover_values(self):
+        previous = 0
+        for value in range(100000):
+            bucket = get_bucket(value)
+            low, high = get_bucket_range(bucket)
+            self.assertTrue(low <= value <= high)
+            self.assertLessEqual(high - low, max(1, value // 32))
+            self.assertIn(bucket - previous, (0, 1))
+            previous = bucket
+
+    def test_percentiles_and_merge(self):
+        first = LatencyHistogram()
+        second = LatencyHistogram()
+        for value in range(1, 501):
+            first.record(value)
+            second.record(value + 500)
+        second.record(-1)
+        merged = LatencyHistogram.loads(first.dumps()).merge(
+            LatencyHistogram.loads(second.dumps()))
+        summary = merged.summary()
+        self.assertEqual((summary['count'], summary['max']), (1000, 1000))
+        for percentile in (50, 90, 99):
+            self.assertAlmostEqual(
+                summary['p{}'.format(percentile)], percentile * 10,
+                delta=percentile * 10 * 0.04)
+        self.assertIsNone(LatencyHistogram.loads('').summary())
+
+
+class RunProfileCommandTest(TestCase):
+    def setUp(self):
+        owner = User.objects.create(username='owner')
+        self.profile = TestConfiguration.objects.create(name='nightly', owner=owner)
+        for operation_id, method in [('getBanks', 'get'), ('createBank', 'post')]:
+            ProfileOperation.objects.create(
+                profile=self.profile, operation_id=operation_id, json_body='{}',
+                urlpath='/banks', remark='', method=method)
+
+    def test_reports_and_exit_code(self):
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            junit = os.path.join(directory, 'junit.xml')
+            with mock.patch.object(API, 'call', lambda *args, **kwargs: FakeResponse(200)), \
+                    mock.patch.object(API, 'get_swagger_index', return_value={}):
+                with self.assertRaises(SystemExit) as context:
+                    call_command(
+                        'run_profile', 'nightly', '--directlogin-token', 'token',
+                        '--workers', '2', '--repeat', '2', '--ndjson', '-',
+                        '--junit', junit, stdout=out, stderr=StringIO())
+            with open(junit) as f:
+                report = f.read()
+        self.assertEqual(context.exception.code, 1)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(lines), 4)
+        self.assertIn('tests="4" failures="2" errors="0"', report)
+        self.assertEqual(self.profile.runs.get().results.count(), 4)
+
+
+class BenchmarkTest(TestCase):
+    def test_scales_documents(self):
+        swagger = scale_document(load_document('OBPv4.0.0'), 50)
+        operation_ids = [
+            operation['operationId']
+            for methods in swagger['paths'].values() for operation in methods.values()]
+        self.assertEqual(len(operation_ids), 50)
+        self.assertEqual(len(set(operation_ids)), 50)
+        original = load_document('OBPv4.0.0')['definitions']
+        self.assertEqual(len(swagger['definitions']), len(original) * 3)
+        copied = swagger['paths']['/obp/v4.0.0/banks/copy-2']['post']
+        self.assertEqual(
+            copied['parameters'][0]['schema']['$ref'], '#/definitions/BankJsonv400Copy2')
+        self.assertIn('BankJsonv400Copy2', swagger['definitions'])
+
+    def test_reports_every_benchmark(self):
+        report = run_benchmarks(['BGv1.3'], [30], repeat=1)
+        self.assertEqual(
+            [result['benchmark'] for result in report['results']], BENCHMARKS)
+        self.assertEqual(
+            ProfileOperation.objects.filter(profile__api_version='BGv1.3').count(), 30)
+        slower = dict(report, results=[
+            dict(result, median=result['median'] * 2 + 1) for result in report['results']])
+        self.assertEqual(report['documents']['BGv1.3']['same_as'], [])
+        self.assertIsNone(report['documents']['BGv1.3']['recorded'])
+        self.assertEqual(
+            describe_documents(['OBPv4.0.0', 'OBPv5.1.0'])['OBPv5.1.0']['same_as'],
+            ['OBPv4.0.0'])
+        self.assertEqual(find_regressions(report, report), [])
+        self.assertEqual(len(find_regressions(report, slower)), len(BENCHMARKS))
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Substitution of placeholders in URL paths by values of a test profile
+"""
+
+import re
+
+
+# TODO: These have to map to attributes of models.TestConfiguration
+URLPATH_DEFAULT = [
+    '3.1.0',
+    'Test', 'Test', '1',
+    '1', '1', '1', '1',
+    '1',
+    '1', '1', '1', '1',
+    '1', '1', '1',
+    '1', '1',
+]
+
+URLPATH_REPLACABLES = [
+    'API_VERSION',
+    'USERNAME', 'USER_ID', 'PROVIDER_ID',
+    'BANK_ID', 'BRANCH_ID', 'ATM_ID', 'PRODUCT_CODE',
+    'OTHER_ACCOUNT_ID',
+    'ACCOUNT_ID', 'VIEW_ID', 'TRANSACTION_ID', 'COUNTERPARTY_ID',
+    'CUSTOMER_ID', 'MEETING_ID', 'CONSUMER_ID',
+    'FROM_CURRENCY_CODE', 'TO_CURRENCY_CODE',
+]
+
+# API sometimes uses '{match}' or 'match' to denote variables. Bare
+# placeholders must be whole tokens, so e.g. BANK_ID inside OTHER_BANK_ID
+# is left alone.
+_ALTERNATION = '|'.join(
+    re.escape(match) for match in sorted(URLPATH_REPLACABLES, key=len, reverse=True))
+URLPATH_PATTERN = re.compile(
+    r'\{(%s)\}|(?<!\w)(%s)(?!\w)' % (_ALTERNATION, _ALTERNATION))
+
+
+class UrlpathExpander(object):
+    """Replaces all placeholders of a path in a single pass"""
+
+    def __init__(self, testconfig):
+        self.values = {}
+        for index, match in enumerate(URLPATH_REPLACABLES):
+            value = getattr(testconfig, match.lower())
+            self.values[match] = value if value else URLPATH_DEFAULT[index]
+
+    def replace(self, match):
+        return self.values[match.group(1) or match.group(2)]
+
+    def expand(self, path):
+        """Returns given path with placeholders replaced"""
+        if not path:
+            return path
+        return URLPATH_PATTERN.sub(self.replace, path)
+
+    def expand_all(self, paths):
+        """Returns given paths with placeholders replaced"""
+        return [self.expand(path) for path in paths]
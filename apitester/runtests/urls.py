@@ -7,7 +7,13 @@ from django.conf.urls import url
 
 from .views import (
     IndexView,
+    OperationsFeedView,
     RunView,
+    BatchRunView,
+    BatchSaveView,
+    LoadTestView,
+    OpenLoopView,
+    StreamRunView,
     TestConfigurationCreateView,
     TestConfigurationUpdateView,
     TestConfigurationDeleteView,
@@ -19,9 +25,27 @@ urlpatterns = [
     url(r'^$',
         IndexView.as_view(),
         name='runtests-index'),
+    url(r'^(?P<testconfig_pk>[0-9]+)/operations$',
+        OperationsFeedView.as_view(),
+        name='runtests-operations'),
     url(r'^(?P<testconfig_pk>[0-9]+)',
         IndexView.as_view(),
         name='runtests-index-testconfig'),
+    url(r'^run/batch/(?P<testconfig_pk>[0-9]+)$',
+        BatchRunView.as_view(),
+        name='runtests-run-batch'),
+    url(r'^run/stream/(?P<testconfig_pk>[0-9]+)$',
+        StreamRunView.as_view(),
+        name='runtests-run-stream'),
+    url(r'^run/load/(?P<testconfig_pk>[0-9]+)$',
+        LoadTestView.as_view(),
+        name='runtests-run-load'),
+    url(r'^run/open/(?P<testconfig_pk>[0-9]+)$',
+        OpenLoopView.as_view(),
+        name='runtests-run-open'),
+    url(r'^save/batch/(?P<testconfig_pk>[0-9]+)$',
+        BatchSaveView.as_view(),
+        name='runtests-save-batch'),
     url(r'^run/(?P<testmethod>\w+)/(?P<testpath>.+)/(?P<testconfig_pk>[0-9]+)/(?P<operation_id>.+)',
         RunView.as_view(),
         name='runtests-run'),
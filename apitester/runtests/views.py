@@ -3,6 +3,7 @@
 Views of runtests app
 """
 
+import hashlib
 import json
 import urllib
 import re
@@ -11,41 +12,38 @@ import time
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.exceptions import PermissionDenied 
-from django.http import JsonResponse, HttpResponse
+from django.core.exceptions import (
+    PermissionDenied, SuspiciousOperation, ValidationError)
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.http import (
+    JsonResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.urls import reverse_lazy, reverse
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
 from django.views.generic.edit import CreateView, UpdateView, DeleteView
 
 from obp.api import API, APIError
+from obp.swagger import get_definition_name
+from obp.versions import catalogue, make_choices
 import logging
+from .bodies import get_request_body
 from .forms import TestConfigurationForm
+from .histogram import LatencyHistogram
+from .history import RunRecorder
+from .load import ClosedLoop, OpenLoop, parse_stages
 from .models import TestConfiguration, ProfileOperation
+from .runner import (
+    check_plan, execute, expected_status_code, get_concurrency,
+    get_swagger_index, iter_plan, make_config, run_plan, run_test)
 from base.views import get_api_versions
 
 
 
 LOGGER = logging.getLogger(__name__)
-# TODO: These have to map to attributes of models.TestConfiguration
-URLPATH_DEFAULT = [
-    '3.1.0',
-    'Test', 'Test', '1',
-    '1', '1', '1', '1',
-    '1',
-    '1', '1', '1', '1',
-    '1', '1', '1',
-    '1', '1',
-]
-
-URLPATH_REPLACABLES = [
-    'API_VERSION',
-    'USERNAME', 'USER_ID', 'PROVIDER_ID',
-    'BANK_ID', 'BRANCH_ID', 'ATM_ID', 'PRODUCT_CODE',
-    'OTHER_ACCOUNT_ID',
-    'ACCOUNT_ID', 'VIEW_ID', 'TRANSACTION_ID', 'COUNTERPARTY_ID',
-    'CUSTOMER_ID', 'MEETING_ID', 'CONSUMER_ID',
-    'FROM_CURRENCY_CODE', 'TO_CURRENCY_CODE',
-]
+
 
 class IndexView(LoginRequiredMixin, TemplateView):
     """Index view for runtests"""
@@ -81,7 +79,6 @@ class IndexView(LoginRequiredMixin, TemplateView):
         except ProfileOperation.DoesNotExist:
             objs = None
 
-        request_body = {}
         urlpath = get_urlpath(testconfigs["selected"], path)
 
         if objs is not None and len(objs) > 0:
@@ -106,21 +103,8 @@ class IndexView(LoginRequiredMixin, TemplateView):
 
         elif method == 'post' or method == 'put':
             # generate json body from swagger
-            definition = data[method]['parameters'][0] if len(data[method]['parameters']) > 0 else None
-            definition = definition['schema']['$ref'][14:]
-            params = swagger['definitions'][definition]
-            if len(params["required"]) > 0:
-                for field in params["required"]:
-                    # Match Profile variables
-                    field_names = [f.name for f in TestConfiguration._meta.fields]
-                    if field in field_names:
-                        request_body[field] = getattr(testconfigs["selected"], field)
-                    else:
-                        try:
-                            request_body[field] = params["properties"][field].get("example", "")
-                        except:
-                            request_body[field] = None
-            params = json.dumps(request_body, indent=4)
+            params = get_request_body(
+                swagger, get_definition_name(data[method]), testconfigs["selected"])
 
         return [{
             'urlpath': urlpath,
@@ -136,32 +120,22 @@ class IndexView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super(IndexView, self).get_context_data(**kwargs)
         calls = []
+        next_cursor = None
+        operation_ids = []
         testconfig_pk = kwargs.get('testconfig_pk', 0)
         testconfigs = self.get_testconfigs(testconfig_pk)
 
-        swaggers = ProfileOperation.objects.filter(profile_id=int(testconfig_pk)).order_by('-save_time', 'id')
-
-        operation_ids = []
-        for operation in swaggers:
-            if operation.is_deleted==0:
-                obj = {
-                    'id': operation.id,
-                    'urlpath': get_urlpath(testconfigs['selected'], operation.urlpath),
-                    'method': operation.method,
-                    'order': operation.order,
-                    'params': operation.json_body,
-                    'summary': operation.remark,
-                    'operationId': operation.operation_id,
-                    'replica_id': operation.replica_id,
-                    'responseCode': 200,
-                }
-                calls.append(obj)
-            if operation.operation_id not in operation_ids:
-                operation_ids.append(operation.operation_id)
+        if testconfigs['selected'] is not None:
+            calls, next_cursor = get_operations_page(testconfigs['selected'])
+            operation_ids = ProfileOperation.objects.filter(
+                profile_id=testconfigs['selected'].pk,
+            ).order_by('operation_id').values_list(
+                'operation_id', flat=True).distinct()
 
         context.update({
             'swaggers': operation_ids,
             'calls': calls,
+            'next_cursor': next_cursor,
             'testconfigs': testconfigs,
             'testconfig_pk': testconfig_pk,
         })
@@ -169,6 +143,62 @@ class IndexView(LoginRequiredMixin, TemplateView):
         return context
 
 
+class OperationsFeedView(LoginRequiredMixin, View):
+    """
+    Paginated JSON feed of the operations of a profile as shown by IndexView
+
+    Takes GET parameters `cursor` (from the previous page) and `limit`.
+    Supports conditional requests with ETag and Last-Modified.
+    """
+
+    def get_testconfig(self, testconfig_pk):
+        try:
+            return TestConfiguration.objects.get(
+                owner=self.request.user, pk=testconfig_pk)
+        except TestConfiguration.DoesNotExist as err:
+            raise PermissionDenied
+
+    def get_etag(self, testconfig, state):
+        """Changes whenever an operation or a placeholder value changes"""
+        values = sorted(testconfig.urlpath_expander.values.items())
+        data = '{}:{}:{}:{}'.format(
+            testconfig.pk, json.dumps(state, sort_keys=True), values,
+            self.request.GET.urlencode())
+        return quote_etag(hashlib.sha1(data.encode('utf-8')).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        testconfig = self.get_testconfig(kwargs['testconfig_pk'])
+        state = ProfileOperation.objects.filter(profile_id=testconfig.pk).aggregate(
+            count=Count('id'),
+            deleted=Sum('is_deleted'),
+            last_id=Max('id'),
+            last_saved=Max('save_time'),
+        )
+        # Finished runs change the latencies of the operations
+        last_run = testconfig.runs.aggregate(last_run=Max('finished'))['last_run']
+        state['last_run'] = last_run.timestamp() if last_run else 0
+        etag = self.get_etag(testconfig, state)
+        last_modified = int(max(state['last_saved'] or 0, state['last_run'])) or None
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+
+        try:
+            calls, next_cursor = get_operations_page(
+                testconfig, request.GET.get('cursor'), request.GET.get('limit'))
+        except ValueError as err:
+            return HttpResponseBadRequest(str(err))
+        response = JsonResponse({
+            'operations': calls,
+            'next_cursor': next_cursor,
+        })
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
 class RunView(LoginRequiredMixin, TemplateView):
     """Run an actual test against the API"""
     template_name = "runtests/index.html"
@@ -182,26 +212,12 @@ class RunView(LoginRequiredMixin, TemplateView):
             del context['view']
         return context
 
-    def api_replace(self, string, match, value):
-        """Helper to replace format strings from the API"""
-        # API sometimes uses '{match}' or 'match' to denote variables
-        return string. \
-            replace('{{{}}}'.format(match), value). \
-            replace(match, value)
-
     def get_urlpath(self, testconfig, path):
         """
         Gets a URL path
         where placeholders in given path are replaced by values from testconfig
         """
-        urlpath = path
-        for index, match in enumerate(URLPATH_REPLACABLES):
-            value = getattr(testconfig, match.lower())
-            if value:
-                urlpath = self.api_replace(urlpath, match, value)
-            else:
-                urlpath = self.api_replace(urlpath, match, URLPATH_DEFAULT[index])
-        return urlpath
+        return get_urlpath(testconfig, path)
 
     # get config for one operation.
     def get_config(self, testmethod, testpath, testconfig_pk, operation_id):
@@ -224,11 +240,16 @@ class RunView(LoginRequiredMixin, TemplateView):
                 operation_id=operation_id,  # OBPv3.0.0-getBanks
                 is_deleted=0
             )
+            # Replicas share the operation id, the runner sends its own
+            operation_pk = self.request.POST.get('operation_pk') or ''
+            if operation_pk.isdigit():
+                objs = objs.filter(pk=int(operation_pk))
         except ProfileOperation.DoesNotExist:
             objs = None
 
         config = {
             'found': True,
+            'id': None if objs is None or len(objs) == 0 else objs[0].id,
             'method': testmethod,
             'status_code': status_code,
             'summary': 'Unknown',
@@ -242,19 +263,23 @@ class RunView(LoginRequiredMixin, TemplateView):
                 owner=self.request.user, pk=testconfig_pk)
         except TestConfiguration.DoesNotExist as err:
             raise PermissionDenied
+        self.testconfig = testconfig
+        config['api_version'] = testconfig.api_version
         try:
-            swagger = self.api.get_swagger(testconfig.api_version)
+            index = self.api.get_swagger_index(testconfig.api_version)
         except APIError as err:
             messages.error(self.request, err)
         else:
-            for path, data in swagger['paths'].items():
-                if testmethod in data and data[testmethod]['operationId'] == operation_id:
-                    config.update({
-                        'found': True,
-                        'operation_id': data[testmethod]['operationId'],
-                        'summary': data[testmethod]['summary'],
-                        'urlpath': self.get_urlpath(testconfig, path),
-                    })
+            operation = index.get(operation_id)
+            if operation is not None and operation['method'] == testmethod:
+                config.update({
+                    'found': True,
+                    'operation_id': operation_id,
+                    'status_code': expected_status_code(
+                        testmethod, operation.get('status_codes')),
+                    'summary': operation['summary'],
+                    'urlpath': self.get_urlpath(testconfig, operation['path']),
+                })
         return config
 
     def post(self, request, *args, **kwargs):
@@ -263,27 +288,7 @@ class RunView(LoginRequiredMixin, TemplateView):
 
     def run_test(self, config):
         """Runs a test with given config"""
-        url = '{}{}'.format(settings.API_HOST, config['urlpath'])
-        # Let APIError bubble up
-        if config['method'] == 'get' or config['method'] == 'delete':
-            response = self.api.call(config['method'], url)
-        else:
-            try:
-                response = self.api.call(config['method'], url, json.loads(config['payload']))
-            except:
-                response = self.api.call(config['method'], url)
-        try:
-            text = response.json()
-        except json.decoder.JSONDecodeError as err:
-            text = response.text
-        text = json.dumps(
-            text, sort_keys=True, indent=2, separators=(',', ': '))
-        result = {
-            'text': text,
-            'execution_time': response.execution_time,
-            'status_code': response.status_code,
-        }
-        return result
+        return run_test(self.api, config)
 
     def get_context_data(self, **kwargs):
         context = super(RunView, self).get_context_data(**kwargs)
@@ -295,38 +300,246 @@ class RunView(LoginRequiredMixin, TemplateView):
             config.update({'urlpath': context['testpath']})
         if payload is not None:
             config.update({'payload': payload})
-        context.update({
-            'config': config,
-            'text': None,
-            'execution_time': -1,
-            'messages': [],
-            'success': False,
+        result = execute(self.api, config)
+        recorder = RunRecorder(self.testconfig)
+        recorder.add(result)
+        recorder.finish()
+        context.update(result)
+        return context
+
+
+class BatchRunView(LoginRequiredMixin, View):
+    """
+    Run a selection of a profile's operations server-side
+
+    Expects POST field `operations`, a JSON list of objects with the
+    ProfileOperation `id` and optionally unsaved `urlpath` and `json_body`
+    and the `runner` they came from, and optionally `concurrency`. Every
+    item is run, also several of the same operation, and the results carry
+    the runner in their config.
+    """
+
+    def get_testconfig(self, testconfig_pk):
+        try:
+            return TestConfiguration.objects.get(
+                owner=self.request.user, pk=testconfig_pk)
+        except TestConfiguration.DoesNotExist as err:
+            raise PermissionDenied
+
+    def get_selection(self):
+        """Returns the requested operations with their ProfileOperation id"""
+        try:
+            selection = json.loads(self.request.POST.get('operations', '[]'))
+            return [dict(item, id=int(item['id'])) for item in selection]
+        except (TypeError, ValueError, KeyError) as err:
+            raise SuspiciousOperation('Invalid operations: {}'.format(err))
+
+    def get_plan(self, testconfig, selection):
+        """Builds the run plan with a single database query"""
+        operations = ProfileOperation.objects.filter(
+            profile_id=testconfig.pk,
+            id__in=[item['id'] for item in selection],
+            is_deleted=0,
+        )
+        operations = {operation.id: operation for operation in operations}
+        index = get_swagger_index(
+            API(self.request.session.get('obp')), testconfig) if operations else {}
+        plan = []
+        for item in selection:
+            if item['id'] not in operations:
+                continue
+            operation = operations[item['id']]
+            urlpath = item.get('urlpath') or get_urlpath(
+                testconfig, operation.urlpath)
+            config = make_config(
+                testconfig, operation, urlpath, item.get('json_body'), index)
+            config['runner'] = item.get('runner')
+            plan.append(config)
+        return plan
+
+    def post(self, request, *args, **kwargs):
+        testconfig = self.get_testconfig(kwargs['testconfig_pk'])
+        plan = self.get_plan(testconfig, self.get_selection())
+        try:
+            check_plan(plan)
+        except ValueError as err:
+            return HttpResponseBadRequest(str(err))
+        api = API(request.session.get('obp'))
+        concurrency = get_concurrency(request.POST.get('concurrency'))
+        recorder = RunRecorder(testconfig, concurrency)
+        try:
+            results = run_plan(api, plan, concurrency)
+            for result in results:
+                recorder.add(result)
+        finally:
+            recorder.finish()
+        return JsonResponse({'results': results})
+
+
+class BatchSaveView(BatchRunView):
+    """
+    Saves edits of many operations of a profile with one request
+    Takes POST `operations` as JSON list of objects with `id` and any of
+    `order`, `remark`, `json_body` and `urlpath`.
+    """
+
+    def post(self, request, *args, **kwargs):
+        testconfig = self.get_testconfig(kwargs['testconfig_pk'])
+        outcomes = profileOperation_bulk_update(
+            testconfig.pk, {item['id']: item for item in self.get_selection()})
+        return JsonResponse({
+            'results': [{'id': pk, 'state': state} for pk, state in outcomes.items()],
         })
-        if not config['found']:
-            msg = 'Unknown path {}!'.format(kwargs['testpath'])
-            context['messages'].append(msg)
-            return context
 
+
+class LoadTestView(BatchRunView):
+    """
+    Closed-loop load test of one of a profile's operations
+
+    Expects POST fields `operation` (ProfileOperation id), `users` and
+    `requests` and/or `duration` in seconds, and optionally unsaved
+    `urlpath` and `json_body`. Returns throughput, error rate and latency
+    percentiles. The run is recorded in the run history.
+    """
+
+    def get_selection(self):
         try:
-            result = self.run_test(config)
-        except APIError as err:
-            context['messages'].append(err)
-            return context
-        else:
-            context.update(result)
+            pk = int(self.request.POST.get('operation'))
+        except (TypeError, ValueError) as err:
+            raise SuspiciousOperation('Invalid operation: {}'.format(err))
+        item = {'id': pk}
+        for key in ['urlpath', 'json_body']:
+            if self.request.POST.get(key) is not None:
+                item[key] = self.request.POST[key]
+        return [item]
 
-        # Test if status code is as expected
-        if result['status_code'] != config['status_code']:
-            msg = 'Status code is {}, but expected {}!'.format(
-                result['status_code'], config['status_code'])
-            context['messages'].append(msg)
-            return context
+    def post(self, request, *args, **kwargs):
+        testconfig = self.get_testconfig(kwargs['testconfig_pk'])
+        plan = self.get_plan(testconfig, self.get_selection())
+        if not plan:
+            return HttpResponseBadRequest('Unknown operation')
+        api = API(request.session.get('obp'))
+        try:
+            loop = ClosedLoop(
+                api, plan[0], request.POST.get('users'),
+                request.POST.get('requests'), request.POST.get('duration'))
+        except ValueError as err:
+            return HttpResponseBadRequest(str(err))
+        recorder = RunRecorder(testconfig, loop.users)
+        try:
+            report = loop.run(recorder)
+        finally:
+            recorder.finish()
+        report['config'] = plan[0]
+        return JsonResponse(report)
 
-        context['success'] = True
-        return context
+
+class OpenLoopView(BatchRunView):
+    """
+    Open-loop load test of a selection of a profile's operations
+
+    Takes the same POST fields as BatchRunView plus the arrival process
+    `arrival` (constant or poisson), optional `seed`, and either `rate`
+    per second and `duration` in seconds or `stages`, a JSON list of
+    [duration, target rate] pairs. Returns the report, including the
+    intended and actual send time of every request if `timeline` is set.
+    """
+
+    def post(self, request, *args, **kwargs):
+        testconfig = self.get_testconfig(kwargs['testconfig_pk'])
+        plan = self.get_plan(testconfig, self.get_selection())
+        api = API(request.session.get('obp'))
+        try:
+            stages = parse_stages(
+                json.loads(request.POST.get('stages') or 'null'),
+                request.POST.get('rate'), request.POST.get('duration'))
+            loop = OpenLoop(
+                api, plan, stages, request.POST.get('arrival', 'constant'),
+                request.POST.get('seed') or None,
+                bool(request.POST.get('timeline')))
+        except (TypeError, ValueError) as err:
+            return HttpResponseBadRequest(str(err))
+        recorder = RunRecorder(testconfig, settings.OPEN_LOOP_MAX_WORKERS)
+        try:
+            report = loop.run(recorder)
+        finally:
+            recorder.finish()
+        return JsonResponse(report)
+
+
+class StreamRunView(BatchRunView):
+    """
+    Run a selection of a profile's operations server-side and stream each
+    result as a Server-Sent Event as soon as its call finishes
+
+    Takes the same POST fields as BatchRunView. Sends one `result` event
+    per operation and a final `end` event.
+    """
+
+    def format_event(self, event, data):
+        return 'event: {}\ndata: {}\n\n'.format(
+            event, json.dumps(data, cls=DjangoJSONEncoder))
+
+    def stream(self, api, plan, testconfig, concurrency):
+        count = 0
+        # Created on the first chunk, so a response which is never sent
+        # does not leave an unfinished run behind
+        recorder = RunRecorder(testconfig, concurrency)
+        try:
+            for result in iter_plan(api, plan, recorder.run.concurrency):
+                count += 1
+                recorder.add(result)
+                yield self.format_event('result', result)
+        finally:
+            # Also keep what was run if the client went away
+            recorder.finish()
+        yield self.format_event('end', {'count': count})
+
+    def post(self, request, *args, **kwargs):
+        testconfig = self.get_testconfig(kwargs['testconfig_pk'])
+        plan = self.get_plan(testconfig, self.get_selection())
+        try:
+            check_plan(plan)
+        except ValueError as err:
+            return HttpResponseBadRequest(str(err))
+        api = API(request.session.get('obp'))
+        response = StreamingHttpResponse(
+            self.stream(api, plan, testconfig,
+                        get_concurrency(request.POST.get('concurrency'))),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class ApiVersionFormMixin(object):
+    """Offers the API versions of the shared catalogue in the form"""
+
+    def dispatch(self, request, *args, **kwargs):
+        self.api = API(request.session.get('obp'))
+        return super(ApiVersionFormMixin, self).dispatch(request, *args, **kwargs)
+
+    def get_form(self, *args, **kwargs):
+        form = super(ApiVersionFormMixin, self).get_form(*args, **kwargs)
+        # Cannot add api in constructor: super complains about unknown kwarg
+        form.api = self.api
+        fields = form.fields
+        try:
+            fields['api_version'].choices = catalogue.get_choices(self.api)
+            fields['api_version'].help_text = '{} Known standards: {}'.format(
+                fields['api_version'].help_text,
+                ', '.join(catalogue.get_standards(self.api)))
+        except Exception as err:
+            messages.error(self.request, err)
+            # Still allow to create and edit profiles while the API is down
+            fields['api_version'].choices = make_choices(
+                catalogue.get_fallback_versions())
+        return form
 
 
-class TestConfigurationCreateView(LoginRequiredMixin, CreateView):
+class TestConfigurationCreateView(LoginRequiredMixin, ApiVersionFormMixin, CreateView):
     model = TestConfiguration
     form_class = TestConfigurationForm
 
@@ -353,7 +566,6 @@ class TestConfigurationCreateView(LoginRequiredMixin, CreateView):
 
     def get_success_url(self):
         testconfig = self.get_testconfigs(self.object.pk)['selected']
-        self.api = API(self.request.session.get('obp'))
         
         api_version = testconfig.api_version
         resource_doc_params = testconfig.resource_doc_params
@@ -367,9 +579,7 @@ class TestConfigurationCreateView(LoginRequiredMixin, CreateView):
 
 
         # Within successful response we expect there to be paths
-        try:
-            swagger_paths_items = swagger['paths'].items()
-        except KeyError as err:
+        if 'paths' not in swagger:
             # We probably can extract the reason from the response("swagger")
             response_code = swagger['code']
             message = swagger['message']
@@ -380,43 +590,16 @@ class TestConfigurationCreateView(LoginRequiredMixin, CreateView):
             #return reverse('runtests-index-testconfig', kwargs={})
 
         # Continue extracting the endpoints from the swagger json
-        for path, data in swagger_paths_items:
-            try: # there are some special endpoints in obp-api side, the swagger format is not good enough to show in the API Tester, here we just log them.
-                for method, content in data.items():
-                    urlpath = path
-                    remark = content['summary']
-                    params = ''
-                    if method == 'post' or method == 'put':
-                        definition = content['parameters'][0] if len(content['parameters']) > 0 else None
-                        definition = definition['schema']['$ref'][14:]  # /definitions/BankJson400 -->  BankJson400
-                        params = swagger['definitions'][definition]
-                        request_body = {}
-                        if len(params["required"]) > 0:
-                            for field in params["required"]:
-                                # Match Profile variables
-                                field_names = [f.name for f in TestConfiguration._meta.fields]
-                                if field in field_names:
-                                    request_body[field] = getattr(testconfig, field)
-                                else:
-                                    try:
-                                        request_body[field] = params["properties"][field].get("example", "")
-                                    except:
-                                        request_body[field] = None
-                        params = json.dumps(request_body, indent=4)
-                    operation_id = content['operationId']
-                    profile_id = testconfig.pk
-                    profileOperation_insert(operation_id, params, profile_id, urlpath, remark, method)
-            except Exception as e:
-                #TODO, maybe later, we can show this to the HTML.
-                logging.error("this endpoint (path = {}) can not be used in API_Tester, check the format.".format(str(path)))
-                logging.error("the reason is : {}".format(e)) 
+        operations = get_profile_operations(swagger, testconfig)
+        counts = profileOperation_bulk_insert(testconfig.pk, operations)
+        messages.info(self.request, 'Operations created: {created}, updated: {updated}, unchanged: {skipped}'.format(**counts))
 
         return reverse('runtests-index-testconfig', kwargs={
             'testconfig_pk': self.object.pk,
         })
 
 
-class TestConfigurationUpdateView(LoginRequiredMixin, UpdateView):
+class TestConfigurationUpdateView(LoginRequiredMixin, ApiVersionFormMixin, UpdateView):
     model = TestConfiguration
     form_class = TestConfigurationForm
 
@@ -435,23 +618,6 @@ class TestConfigurationUpdateView(LoginRequiredMixin, UpdateView):
             'testconfig_pk': self.object.pk,
         })
 
-    def dispatch(self, request, *args, **kwargs):
-            self.api = API(request.session.get('obp'))
-            return super(TestConfigurationUpdateView, self).dispatch(request, *args, **kwargs)
-
-    def get_form(self, *args, **kwargs):
-        form = super(TestConfigurationUpdateView, self).get_form(*args, **kwargs)
-        # Cannot add api in constructor: super complains about unknown kwarg
-        form.api = self.api
-        fields = form.fields
-        try:
-            fields['api_version'].choices = self.api.get_api_version_choices()
-        except APIError as err:
-            messages.error(self.request, err)
-        except Exception as err:
-            messages.error(self.request, err)
-        return form
-
     def get_context_data(self, **kwargs):
         context = super(TestConfigurationUpdateView, self).get_context_data(**kwargs)
         context.update({
@@ -471,7 +637,35 @@ class TestConfigurationDeleteView(LoginRequiredMixin, DeleteView):
             raise PermissionDenied
         return object
 
-def profileOperation_insert(operation_id, json_body, profile_id, urlpath, remark, method, replica_id = 1, order=100):
+def get_profile_operations(swagger, testconfig):
+    """
+    Returns the operations of given swagger document as expected by
+    profileOperation_bulk_insert, with request bodies for post and put
+    """
+    operations = []
+    for path, data in swagger['paths'].items():
+        try: # there are some special endpoints in obp-api side, the swagger format is not good enough to show in the API Tester, here we just log them.
+            for method, content in data.items():
+                urlpath = path
+                remark = content['summary']
+                params = ''
+                if method == 'post' or method == 'put':
+                    params = get_request_body(
+                        swagger, get_definition_name(content), testconfig)
+                operations.append({
+                    'operation_id': content['operationId'],
+                    'json_body': params,
+                    'urlpath': urlpath,
+                    'remark': remark,
+                    'method': method,
+                })
+        except Exception as e:
+            #TODO, maybe later, we can show this to the HTML.
+            logging.error("this endpoint (path = {}) can not be used in API_Tester, check the format.".format(str(path)))
+            logging.error("the reason is : {}".format(e))
+    return operations
+
+def profileOperation_insert(operation_id, json_body, profile_id, urlpath, remark, method, replica_id = 1, order=100, depends_on=None):
     data = {
         'operation_id': operation_id,
         'json_body': json_body,
@@ -481,15 +675,125 @@ def profileOperation_insert(operation_id, json_body, profile_id, urlpath, remark
         'remark': remark,
         'is_deleted': 0,
         'method': method,
-        'save_time': str(int(time.time()))
+        'save_time': int(time.time())
     }
+    if depends_on is not None:
+        data['depends_on'] = depends_on
 
-    ProfileOperation.objects.update_or_create(
+    operation, _ = ProfileOperation.objects.update_or_create(
         operation_id=operation_id,
         profile_id=profile_id,
         replica_id=replica_id,
         defaults=data
     )
+    return operation
+
+def profileOperation_bulk_insert(profile_id, operations, order=100):
+    """
+    Creates or updates the first replica of given operations of a profile
+    in one transaction. operations is a list of dicts with keys
+    operation_id, json_body, urlpath, remark and method.
+    Returns how many operations were created, updated or skipped because
+    they were unchanged.
+    """
+    save_time = int(time.time())
+    fields = ['json_body', 'order', 'urlpath', 'remark', 'is_deleted', 'method']
+    # Later duplicates of an operation id win, like repeated update_or_create
+    operations = {data['operation_id']: data for data in operations}
+    counts = {'created': 0, 'updated': 0, 'skipped': 0}
+    to_create = []
+    to_update = []
+    with transaction.atomic():
+        existing = ProfileOperation.objects.filter(
+            profile_id=profile_id,
+            operation_id__in=list(operations.keys()),
+            replica_id=1,
+        )
+        existing = {obj.operation_id: obj for obj in existing}
+        for operation_id, data in operations.items():
+            values = dict(data, order=order, is_deleted=0)
+            obj = existing.get(operation_id)
+            if obj is None:
+                to_create.append(ProfileOperation(
+                    profile_id=profile_id,
+                    replica_id=1,
+                    save_time=save_time,
+                    **values
+                ))
+            elif all(getattr(obj, field) == values[field] for field in fields):
+                counts['skipped'] += 1
+            else:
+                for field in fields:
+                    setattr(obj, field, values[field])
+                obj.save_time = save_time
+                to_update.append(obj)
+        ProfileOperation.objects.bulk_create(
+            to_create, batch_size=settings.DB_BATCH_SIZE)
+        ProfileOperation.objects.bulk_update(
+            to_update, fields + ['save_time'], batch_size=settings.DB_BATCH_SIZE)
+    counts['created'] = len(to_create)
+    counts['updated'] = len(to_update)
+    return counts
+
+def clean_operation_field(field, value):
+    """
+    Returns given value of a ProfileOperation field converted and checked
+    against the validators of the field, e.g. its max_length. Empty values
+    are allowed like before. Raises ValidationError.
+    """
+    model_field = ProfileOperation._meta.get_field(field)
+    # run_validators skips None, which the database would refuse
+    if value is None and not model_field.null:
+        raise ValidationError('{} must not be null'.format(field))
+    # Text fields would store anything else as its repr
+    if field != 'order' and value is not None and not isinstance(value, str):
+        raise ValidationError('{} must be a string'.format(field))
+    value = model_field.to_python(value)
+    model_field.run_validators(value)
+    return value
+
+def profileOperation_bulk_update(profile_id, edits):
+    """
+    Applies edits to operations of a profile in one transaction
+    edits maps ProfileOperation ids to dicts with any of the keys json_body,
+    order, urlpath, remark and depends_on.
+    Returns the outcome per id: updated, unchanged, missing or invalid.
+    """
+    save_time = int(time.time())
+    fields = ['json_body', 'order', 'urlpath', 'remark', 'depends_on']
+    outcomes = {}
+    to_update = []
+    with transaction.atomic():
+        operations = ProfileOperation.objects.select_for_update().filter(
+            profile_id=profile_id,
+            id__in=list(edits.keys()),
+            is_deleted=0,
+        )
+        operations = {operation.id: operation for operation in operations}
+        for pk, edit in edits.items():
+            operation = operations.get(pk)
+            if operation is None:
+                outcomes[pk] = 'missing'
+                continue
+            try:
+                values = {
+                    field: clean_operation_field(field, edit[field])
+                    for field in fields if field in edit
+                }
+            except ValidationError:
+                outcomes[pk] = 'invalid'
+                continue
+            if all(getattr(operation, field) == value for field, value in values.items()):
+                outcomes[pk] = 'unchanged'
+                continue
+            for field, value in values.items():
+                setattr(operation, field, value)
+            operation.save_time = save_time
+            to_update.append(operation)
+            outcomes[pk] = 'updated'
+        ProfileOperation.objects.bulk_update(
+            to_update, fields + ['save_time'], batch_size=settings.DB_BATCH_SIZE)
+    return outcomes
 
 def saveJsonBody(request):
     operation_id = request.POST.get('operation_id')
@@ -500,8 +804,9 @@ def saveJsonBody(request):
     replica_id = request.POST.get('replica_id')
     method = request.POST.get('method')
     remark = request.POST.get('remark')
+    depends_on = request.POST.get('depends_on')
 
-    profileOperation_insert(operation_id, json_body, profile_id, urlpath, remark, method, replica_id, order)
+    profileOperation_insert(operation_id, json_body, profile_id, urlpath, remark, method, replica_id, order, depends_on)
 
     return JsonResponse({'state': True})
 
@@ -522,9 +827,10 @@ def copyJsonBody(request):
 
     replica_id = max([profile.replica_id for profile in profile_list]) + 1
 
-    profileOperation_insert(operation_id, json_body, profile_id, urlpath, remark, method, replica_id, order)
+    operation = profileOperation_insert(operation_id, json_body, profile_id, urlpath, remark, method, replica_id, order)
 
-    return JsonResponse({'state': True})
+    # The page gives the copy the id of the new replica
+    return JsonResponse({'state': True, 'id': operation.id, 'replica_id': replica_id})
 
 def deleteJsonBody(request):
     operation_id = request.POST.get('operation_id')
@@ -537,32 +843,64 @@ def deleteJsonBody(request):
         replica_id=replica_id
     )
     profile.is_deleted = 1
+    profile.save_time = int(time.time())
     profile.save()
 
     return JsonResponse({'state': True})
 
-def api_replace(string, match, value):
-    """Helper to replace format strings from the API"""
-    # API sometimes uses '{match}' or 'match' to denote variables
-    return string. \
-        replace('{{{}}}'.format(match), value). \
-        replace(match, value)
+def get_operations_page(testconfig, cursor=None, limit=None):
+    """
+    Gets one page of the non-deleted operations of a profile, newest first
+    Returns the calls as rendered by IndexView and the cursor of the next
+    page, which is None on the last page.
+    Raises ValueError for an invalid cursor or limit.
+    """
+    limit = min(int(limit or settings.OPERATIONS_PAGE_SIZE), settings.OPERATIONS_MAX_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError('Invalid limit {}'.format(limit))
+    operations = ProfileOperation.objects.filter(
+        profile_id=testconfig.pk,
+        is_deleted=0,
+    ).order_by('-save_time', 'id')
+    if cursor:
+        try:
+            save_time, last_id = (int(value) for value in cursor.split('.'))
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor {}'.format(cursor))
+        operations = operations.filter(
+            Q(save_time__lt=save_time) | Q(save_time=save_time, id__gt=last_id))
+    operations = list(operations.values(
+        'id', 'urlpath', 'method', 'order', 'json_body', 'remark',
+        'operation_id', 'replica_id', 'save_time', 'latency', 'depends_on',
+    )[:limit + 1])
+
+    next_cursor = None
+    if len(operations) > limit:
+        operations = operations[:limit]
+        next_cursor = '{}.{}'.format(
+            operations[-1]['save_time'], operations[-1]['id'])
+    expander = testconfig.urlpath_expander
+    calls = [{
+        'id': operation['id'],
+        'urlpath': expander.expand(operation['urlpath']),
+        'method': operation['method'],
+        'order': operation['order'],
+        'params': operation['json_body'],
+        'summary': operation['remark'],
+        'operationId': operation['operation_id'],
+        'replica_id': operation['replica_id'],
+        'depends_on': operation['depends_on'],
+        'responseCode': 200,
+        'latency': LatencyHistogram.loads(operation['latency']).summary(),
+    } for operation in operations]
+    return calls, next_cursor
 
 def get_urlpath(testconfig, path):
     """
     Gets a URL path
     where placeholders in given path are replaced by values from testconfig
     """
-    urlpath = path
-    for (index, match) in enumerate(URLPATH_REPLACABLES):
-        if match in urlpath:
-            value = getattr(testconfig, match.lower())
-            if value:
-                urlpath = api_replace(urlpath, match, value)
-            else:
-                urlpath = api_replace(urlpath, match, URLPATH_DEFAULT[index])
-
-    return urlpath
+    return testconfig.urlpath_expander.expand(path)
 
 def addAPI(request):
     operation_id = request.POST.get('operation_id')  # get the operation_id
@@ -574,36 +912,19 @@ def addAPI(request):
         id = profile_id
     )
 
-    swagger = api.get_swagger(config.api_version)['paths']
+    operation = api.get_swagger_index(config.api_version).get(operation_id)
     params = ''
     urlpath=''
     remark=''
 
     method_total = ''
-    for path,operation in swagger.items():
-        for method, content in operation.items():
-            if content['operationId']==operation_id:
-                urlpath = path
-                remark = content['summary']
-                method_total = method
-                if method == 'post' or method == 'put':
-                    definition = content['parameters'][0] if len(content['parameters']) > 0 else None
-                    definition = definition['schema']['$ref'][14:]
-                    params = swagger['definitions'][definition]
-                    request_body = {}
-                    if len(params["required"]) > 0:
-                        for field in params["required"]:
-                            # Match Profile variables
-                            field_names = [f.name for f in TestConfiguration._meta.fields]
-                            if field in field_names:
-                                request_body[field] = getattr(config, field)
-                            else:
-                                try:
-                                    request_body[field] = params["properties"][field].get("example", "")
-                                except:
-                                    request_body[field] = None
-                    params = json.dumps(request_body, indent=4)
-                break
+    if operation is not None:
+        urlpath = operation['path']
+        remark = operation['summary']
+        method_total = operation['method']
+        if method_total == 'post' or method_total == 'put':
+            swagger = api.get_swagger(config.api_version)
+            params = get_request_body(swagger, operation['definition'], config)
 
     profile_list = ProfileOperation.objects.filter(
         operation_id=operation_id,
@@ -10,3 +10,23 @@ errorlog = os.path.join(BASE_DIR, 'logs', 'gunicorn.error.log')
 loglevel = 'info'
 capture_output = True
 workers = multiprocessing.cpu_count() * 2 + 1
+# Load tests run within a request for up to LOAD_MAX_DURATION seconds
+timeout = 90
+
+# Workers write Prometheus metrics to files in this directory, /metrics
+# aggregates them. Must be set before the workers import prometheus_client.
+os.environ.setdefault(
+    'prometheus_multiproc_dir', os.path.join(BASE_DIR, 'prometheus-metrics'))
+
+
+def on_starting(server):
+    """Removes metrics of a previous run"""
+    directory = os.environ['prometheus_multiproc_dir']
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)